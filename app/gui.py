@@ -9,7 +9,7 @@ from pathlib import Path
 
 # from tkinter import *
 # Explicit imports to satisfy Flake8
-from tkinter import Tk, Canvas, Entry, Text, Button, PhotoImage, filedialog
+from tkinter import Tk, Toplevel, Canvas, Entry, Text, Button, PhotoImage, filedialog
 
 
 import sys
@@ -25,11 +25,16 @@ project_root = script_directory.parent
 sys.path.append(str(project_root))
 
 from codeparser import parser
-from utils import ranking
 from utils import dataset
+from utils import snapshot
+from utils.snapshot import snapshot_manager
+from utils.sourcestore import source_store
 
-link_vector_pairs = []
-normalized_documents = {}
+# How often the CURRENT snapshot pointer is checked for a newer version
+RELOAD_INTERVAL_MS = 60 * 1000
+
+last_results = []  # links shown in entry_2, in display order
+last_query = []
 
 def browse_file():
     filename = filedialog.askopenfilename(filetypes=[("Python files", "*.py")])
@@ -41,27 +46,53 @@ def browse_file():
             
 def search_doc():
     query = entry_1.get("1.0", "end").strip()  # Get the query from entry_1
-    scores_dict = {}
 
     q_vectorized = parser.vectorize(query)
-    normq = ranking.norm(ranking.rough_query_to_non_normalized_tfidf(q_vectorized))
-    
-    
-    for link, normalized_document in normalized_documents.items():
-        score = ranking.scoring(q_vectorized, normq, normalized_document, link)
-        scores_dict[link] = score
 
-    sorted_scores = OrderedDict(sorted(scores_dict.items(), key=lambda x: x[1], reverse=True))
+    # Searches run on the current snapshot, which a reload can swap at any time
+    sorted_scores = OrderedDict(snapshot_manager.search(q_vectorized, 10))
 
     # Clear previous results
     entry_2.delete("1.0", "end")
     entry_3.delete("1.0", "end")
 
+    last_results[:] = [link for link, _ in list(sorted_scores.items())[:10]]
+    last_query[:] = q_vectorized
+
     # Insert new results, ensuring alignment
     for i, (link, score) in enumerate(list(sorted_scores.items())[:10], start=1):
         entry_2.insert("end", f"{i}. {link}\n")
         entry_3.insert("end", f"{i}. {score:.2f}\n")
 
+def preview_result(event):
+    # Double-clicking a result opens the best matching lines of its stored source
+    line = int(entry_2.index(f"@{event.x},{event.y}").split(".")[0])
+    if line > len(last_results):
+        return
+
+    link = last_results[line - 1]
+    with snapshot_manager.acquire() as current:
+        found = source_store.snippet(link, last_query, index=current.index if current else None)
+    if found is None:
+        text = "Source not available locally, download the dataset again to store it."
+    else:
+        start_line, end_line, snippet = found
+        text = f"Lines {start_line}-{end_line}\n\n{snippet}"
+
+    preview = Toplevel(window)
+    preview.title(link)
+    preview.configure(bg="#1E1E1E")
+    preview_text = Text(preview, bg="#454343", fg="#FFFFFF", font=("Courier", 10), width=100, height=20)
+    preview_text.insert("1.0", text)
+    preview_text.configure(state="disabled")
+    preview_text.pack(fill="both", expand=True)
+
+def reload_snapshot():
+    # Pick up snapshots published by another process (e.g. a nightly rebuild)
+    # without blocking the window; searches keep using the old one meanwhile
+    snapshot_manager.reload(background=True)
+    window.after(RELOAD_INTERVAL_MS, reload_snapshot)
+
 
 OUTPUT_PATH = Path(__file__).parent
 
@@ -185,6 +216,7 @@ entry_2.place(
     width=274.0,
     height=502.0
 )
+entry_2.bind("<Double-Button-1>", preview_result)
 
 canvas.create_text(
     530.0,
@@ -303,10 +335,10 @@ button_2.place(
 
 dataset.download_files("your github token" ,5)
 print("Initing Dataset...")
-link_vector_pairs = dataset.init()
-
-for pair in link_vector_pairs:
-        normalized_documents[pair[0]] = ranking.norm(ranking.transform_to_non_normalized_tfidf(pair[0]))
+# Only a dataset newer than the current snapshot is published; the snapshot holds the only index
+snapshot.publish_dataset()
+snapshot_manager.reload(background=False)
+window.after(RELOAD_INTERVAL_MS, reload_snapshot)
 
 
 window.resizable(False, False)
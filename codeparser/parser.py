@@ -54,6 +54,9 @@ def vectorize(code_content):
     
 import re
 
+# Bump whenever vectorize() output changes so cached token lists are invalidated
+TOKENIZER_VERSION = 1
+
 operators = [
     '==', '!=', '<=', '>=', '->', '+=', '-=', '*=', '/=', '//=', '%=', '@=', '&=', '|=',
     '^=', '>>=', '<<=', '**', '++', '--', '=', '+', '-', '*', '/', '//', '%', '@',
@@ -0,0 +1,88 @@
+import json
+import random
+
+import pytest
+
+from utils.catalog import IndexCatalog, estimate_memory
+
+
+def write_dataset(path, documents):
+    with open(path, 'w') as file:
+        json.dump([{'link': link, 'vector': str(tokens)} for link, tokens in documents.items()], file)
+    return str(path)
+
+
+@pytest.fixture
+def corpora(tmp_path):
+    rng = random.Random(0)
+    vocabulary = [f"t{i}" for i in range(60)]
+    documents = {f"doc{i}": [rng.choice(vocabulary[:rng.randrange(5, 60)]) for _ in range(rng.randrange(3, 40))]
+                 for i in range(200)}
+    links = list(documents)
+    first = {link: documents[link] for link in links[:80]}
+    second = {link: documents[link] for link in links[80:]}
+    return {
+        'first': write_dataset(tmp_path / "first.json", first),
+        'second': write_dataset(tmp_path / "second.json", second),
+        'full': write_dataset(tmp_path / "full.json", documents),
+        'documents': documents,
+    }
+
+
+def test_federated_scores_match_a_single_index(corpora):
+    catalog = IndexCatalog()
+    catalog.register('first', corpora['first'])
+    catalog.register('second', corpora['second'])
+    catalog.register('full', corpora['full'])
+    full = catalog.get('full')
+
+    rng = random.Random(1)
+    for tokens in rng.sample(list(corpora['documents'].values()), 30):
+        query = tokens[:10] + ['unseen']
+        federated = catalog.federated_search(query, ['first', 'second'], top_k=10)
+        expected = full.search(query, 10)
+        assert [score for _, _, score in federated] == pytest.approx([score for _, score in expected])
+        # Ties may be broken differently, but a document found by both has the same score
+        expected_scores = dict(expected)
+        for _, link, score in federated:
+            if link in expected_scores:
+                assert score == pytest.approx(expected_scores[link])
+
+
+def test_same_document_scores_the_same_in_every_index(tmp_path):
+    catalog = IndexCatalog()
+    catalog.register('a', write_dataset(tmp_path / "a.json", {'doc': ['x', 'y'], 'a1': ['x', 'q'], 'a2': ['z', 'w']}))
+    catalog.register('b', write_dataset(tmp_path / "b.json", {'doc': ['x', 'y'], 'b1': ['y', 'r']}))
+
+    scores = {name: score for name, link, score in catalog.federated_search(['x', 'y', 'z']) if link == 'doc'}
+    assert scores['a'] == pytest.approx(scores['b'])
+
+
+def test_federated_search_does_not_evict_its_own_indexes(corpora):
+    sizing = IndexCatalog()
+    sizing.register('first', corpora['first'])
+    sizing.register('second', corpora['second'])
+    both = estimate_memory(sizing.get('first')) + estimate_memory(sizing.get('second'))
+
+    catalog = IndexCatalog(memory_budget=both * 2)
+    catalog.register('first', corpora['first'])
+    catalog.register('second', corpora['second'])
+    query = corpora['documents']['doc0'][:10]
+    for _ in range(3):
+        catalog.federated_search(query)
+
+    stats = catalog.stats()
+    assert stats['loads'] == 2 and stats['evictions'] == 0
+    assert stats['memory'] == both + stats['federation_memory']
+
+
+def test_evicting_an_index_drops_its_federated_statistics(corpora):
+    catalog = IndexCatalog()
+    catalog.register('first', corpora['first'])
+    catalog.register('second', corpora['second'])
+    catalog.federated_search(corpora['documents']['doc0'][:10])
+    assert catalog.stats()['federation_memory'] > 0
+
+    catalog.evict('first')
+    assert catalog.stats()['federation_memory'] == 0
+    assert catalog.stats()['memory'] == estimate_memory(catalog.get('second'))
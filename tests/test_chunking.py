@@ -0,0 +1,28 @@
+from utils.chunking import chunk_source
+
+
+def spans(source):
+    return [(chunk['name'], chunk['kind'], chunk['start_line'], chunk['end_line']) for chunk in chunk_source(source)]
+
+
+def test_class_header_is_its_own_unit():
+    source = "import os\nclass A(Base):\n    def f(self):\n        pass\n"
+    assert spans(source) == [('module', 'lines', 1, 1), ('A', 'class', 2, 2), ('A.f', 'method', 3, 4)]
+
+
+def test_decorators_stay_with_their_class():
+    source = "@dec\nclass A:\n    def f(self):\n        pass\n"
+    assert spans(source) == [('A', 'class', 1, 2), ('A.f', 'method', 3, 4)]
+
+
+def test_chunks_cover_every_line():
+    source = "import os\n\nX = 1\n\n@dec\ndef f():\n    return X\n\nclass A:\n    y = 2\n\n    def g(self):\n        pass\n\nprint(f())\n"
+    covered = set()
+    for chunk in chunk_source(source, window=2, overlap=0):
+        covered.update(range(chunk['start_line'], chunk['end_line'] + 1))
+    non_blank = {number for number, line in enumerate(source.splitlines(), start=1) if line.strip()}
+    assert non_blank <= covered
+
+
+def test_unparsable_source_falls_back_to_line_windows():
+    assert {chunk['kind'] for chunk in chunk_source("print 'python 2'\n" * 50, window=20, overlap=5)} == {'lines'}
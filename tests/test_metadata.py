@@ -0,0 +1,50 @@
+import random
+
+from utils.metadata import MetadataIndex
+
+
+def test_filter_matches_brute_force():
+    rng = random.Random(0)
+    index = MetadataIndex()
+    metadata = {}
+    for i in range(2000):
+        document = {
+            'repo': f"user/repo{rng.randrange(20)}",
+            'language': rng.choice(['Python', 'Go', None]),
+            'stars': rng.choice([rng.randrange(5000), None]),
+            'last_commit': f"2019-0{rng.randrange(1, 10)}-01",
+        }
+        metadata[f"doc{i}"] = document
+        index.add_document(f"doc{i}", document)
+
+    conditions = [
+        {'language': 'Python'},
+        {'repo': ['USER/REPO3', 'user/repo4'], 'min_stars': 1000},
+        {'language': ['Python', 'Go'], 'max_stars': 2500, 'min_last_commit': '2019-05-01'},
+        {'language': 'Rust'},
+    ]
+    for condition in conditions:
+        expected = set()
+        for link, document in metadata.items():
+            repos = condition.get('repo', [document['repo']])
+            languages = condition.get('language', document['language'])
+            languages = [languages] if isinstance(languages, str) or languages is None else languages
+            stars = document['stars']
+            if document['repo'] not in [repo.lower() for repo in repos] or document['language'] not in languages:
+                continue
+            if ('min_stars' in condition or 'max_stars' in condition) and stars is None:
+                continue
+            if stars is not None and not condition.get('min_stars', 0) <= stars <= condition.get('max_stars', stars):
+                continue
+            if document['last_commit'] < condition.get('min_last_commit', ''):
+                continue
+            expected.add(link)
+        assert index.filter_links(**condition) == expected, condition
+
+
+def test_documents_added_after_a_query_are_found():
+    index = MetadataIndex()
+    index.add_document("a", {'language': 'Python'})
+    assert index.filter_links(language='Python') == {"a"}
+    index.add_document("b", {'language': 'Python'})
+    assert index.filter_links(language='Python') == {"a", "b"}
@@ -0,0 +1,73 @@
+import itertools
+import random
+
+import pytest
+
+from utils.positionalindex import PositionalIndex, decode_positions, encode_positions
+
+
+@pytest.mark.parametrize("positions", [
+    [],
+    [0],
+    [0, 1, 2, 3],
+    [5, 127, 128, 255, 256],
+    [16383, 16384, 2 ** 21, 2 ** 35],
+])
+def test_positions_round_trip(positions):
+    assert decode_positions(encode_positions(positions)) == positions
+
+
+def test_positions_round_trip_random():
+    rng = random.Random(0)
+    for _ in range(200):
+        positions = sorted(rng.sample(range(1 << 20), rng.randrange(1, 50)))
+        assert decode_positions(encode_positions(positions)) == positions
+
+
+def test_small_gaps_take_one_byte():
+    assert len(encode_positions(list(range(100)))) == 100
+
+
+def brute_force_count(tokens, sequence, slop):
+    # A start counts if some choice of later positions matches the sequence within the slop
+    count = 0
+    for start, token in enumerate(tokens):
+        if token != sequence[0]:
+            continue
+        ends = {start}
+        for expected in sequence[1:]:
+            ends = {position for end in ends for position in range(end + 1, min(len(tokens), end + slop + 2))
+                    if tokens[position] == expected}
+        count += bool(ends)
+    return count
+
+
+def test_count_sequence_matches_brute_force():
+    rng = random.Random(1)
+    index = PositionalIndex()
+    documents = {f"doc{i}": [rng.choice('abcd') for _ in range(rng.randrange(1, 40))] for i in range(50)}
+    for link, tokens in documents.items():
+        index.update_index(link, tokens)
+
+    sequences = [list(sequence) for length in (1, 2, 3) for sequence in itertools.product('abcd', repeat=length)]
+    for link, tokens in documents.items():
+        for sequence in sequences:
+            for slop in (0, 1, 2):
+                assert index.count_sequence(link, sequence, slop) == brute_force_count(tokens, sequence, slop), \
+                    (tokens, sequence, slop)
+
+
+def test_count_sequence_follows_later_occurrence_within_slop():
+    index = PositionalIndex()
+    index.update_index("doc", ['a', 'b', 'b', 'x', 'c'])
+    # Only the second 'b' is close enough to 'c'
+    assert index.count_sequence("doc", ['a', 'b', 'c'], slop=1) == 1
+
+
+def test_phrase_search_ranks_matching_documents_only():
+    index = PositionalIndex()
+    index.update_index("match", ['def', 'f', '(', 'x', ')', ':'])
+    index.update_index("reordered", ['f', 'def', '(', ')', 'x', ':'])
+    index.update_index("other", ['import', 'os'])
+
+    assert [link for link, _ in index.phrase_search(['def', 'f', '('])] == ["match"]
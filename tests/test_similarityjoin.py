@@ -0,0 +1,89 @@
+import math
+import random
+
+import pytest
+
+from utils import dataset
+from utils import invertedindex
+from utils import ranking
+from utils import similarityjoin
+from utils.invertedindex import InvertedIndex
+
+
+@pytest.fixture
+def corpus(monkeypatch):
+    rng = random.Random(0)
+    vocabulary = [f"t{i}" for i in range(40)]
+    documents = {}
+    for i in range(120):
+        tokens = [rng.choice(vocabulary[:rng.randrange(5, 40)]) for _ in range(rng.randrange(3, 30))]
+        documents[f"repo/file{i % 60}.py#L{i}-L{i + 1}" if i % 2 else f"repo/doc{i}.py"] = tokens
+    # Near duplicates, so there are pairs above high thresholds too
+    for i in range(10):
+        source = documents[f"repo/doc{2 * i}.py"]
+        documents[f"copy/doc{i}.py"] = source + [rng.choice(vocabulary)]
+
+    index = InvertedIndex()
+    for link, tokens in documents.items():
+        index.update_index(link, tokens)
+    monkeypatch.setattr(invertedindex, 'inverted_index', index)
+    monkeypatch.setattr(dataset, 'documents', documents)
+    return documents
+
+
+def brute_force_pairs(documents, threshold, skip_same_file):
+    links = list(documents)
+    vectors = []
+    for link in links:
+        weights = ranking.tfidf_weights(documents[link])
+        length = math.sqrt(sum(weight * weight for weight in weights.values())) or 1
+        vectors.append({token: weight / length for token, weight in weights.items()})
+
+    pairs = {}
+    for a in range(len(links)):
+        for b in range(a + 1, len(links)):
+            if skip_same_file and similarityjoin.chunking.parent_link(links[a]) == \
+                    similarityjoin.chunking.parent_link(links[b]):
+                continue
+            similarity = sum(weight * vectors[b].get(token, 0) for token, weight in vectors[a].items())
+            pairs[frozenset((links[a], links[b]))] = similarity
+    return {pair: similarity for pair, similarity in pairs.items() if similarity >= threshold - 1e-9}, pairs
+
+
+def read_pairs(path):
+    with open(path) as file:
+        return {frozenset(line.split('\t')[:2]): float(line.split('\t')[2]) for line in file}
+
+
+@pytest.mark.parametrize("threshold", [0.3, 0.6, 0.9])
+@pytest.mark.parametrize("skip_same_file", [True, False])
+def test_all_pairs_matches_brute_force(corpus, tmp_path, threshold, skip_same_file):
+    output = tmp_path / "pairs.tsv"
+    written = similarityjoin.all_pairs(threshold, str(output), processes=1, block_size=16,
+                                       skip_same_file=skip_same_file)
+    found = read_pairs(output)
+    expected, similarities = brute_force_pairs(corpus, threshold, skip_same_file)
+
+    assert written == len(found)
+    assert expected, "the corpus should contain pairs above the threshold"
+    # Pairs within rounding of the threshold may fall on either side
+    assert {pair for pair in expected if similarities[pair] >= threshold + 1e-9} <= set(found)
+    assert set(found) <= set(expected)
+    for pair, similarity in found.items():
+        assert similarity == pytest.approx(similarities[pair], abs=1e-6)
+
+
+def test_prefix_index_keeps_enough_of_every_vector(corpus):
+    links = list(corpus)
+    vectors = similarityjoin.build_vectors(links)
+    threshold = 0.5
+    index = similarityjoin.build_prefix_index(vectors, threshold)
+    indexed = {}
+    for feature, entries in index.items():
+        for row, weight in entries:
+            indexed.setdefault(row, set()).add(feature)
+
+    for row, (features, weights) in enumerate(vectors):
+        unindexed = [weight for feature, weight in zip(features, weights) if feature not in indexed.get(row, ())]
+        # The unindexed suffix alone can never reach the threshold
+        assert math.sqrt(sum(weight * weight for weight in unindexed)) < threshold + 1e-12
@@ -0,0 +1,90 @@
+import os
+import random
+
+import pytest
+
+from utils import ranking
+from utils import snapshot
+from utils.invertedindex import InvertedIndex
+from utils.snapshot import SnapshotManager
+
+
+def corpus(seed, size=60):
+    rng = random.Random(seed)
+    vocabulary = [f"t{i}" for i in range(40)]
+    return {f"v{seed}/doc{i}": [rng.choice(vocabulary) for _ in range(rng.randrange(3, 30))] for i in range(size)}
+
+
+def brute_force(documents, query, top_k=10):
+    # Score every document with ranking.scoring, as the GUI did before snapshots
+    index = InvertedIndex()
+    for link, tokens in documents.items():
+        index.update_index(link, tokens)
+    normq = ranking.norm(ranking.rough_query_to_non_normalized_tfidf(query, index))
+    scores = {}
+    for link in documents:
+        normd = ranking.norm(ranking.transform_to_non_normalized_tfidf(link, index, documents))
+        scores[link] = ranking.scoring(query, normq, normd, link, index)
+    return sorted((score for score in scores.values() if score > 0), reverse=True)[:top_k]
+
+
+def test_search_matches_brute_force_scoring(tmp_path):
+    documents = corpus(0)
+    snapshot.write_snapshot(documents, {}, {}, root=str(tmp_path))
+    manager = SnapshotManager(str(tmp_path))
+    manager.reload(background=False)
+
+    for tokens in list(documents.values())[:20]:
+        query = tokens[:8]
+        assert [score for _, score in manager.search(query)] == pytest.approx(brute_force(documents, query))
+
+
+def test_reload_swaps_only_after_a_newer_version_is_current(tmp_path):
+    root = str(tmp_path)
+    first = snapshot.write_snapshot(corpus(1), {}, {}, root=root)
+    manager = SnapshotManager(root)
+    assert manager.search(['t1']) == []
+
+    assert manager.reload(background=False) == first
+    assert all(link.startswith('v1/') for link, _ in manager.search(['t1']))
+
+    second = snapshot.write_snapshot(corpus(2), {}, {}, root=root)
+    assert second > first
+    manager.reload(background=True).join()
+    assert manager.current.version == second
+    assert all(link.startswith('v2/') for link, _ in manager.search(['t1']))
+
+
+def test_pinned_snapshot_survives_reload_and_garbage_collection(tmp_path):
+    root = str(tmp_path)
+    manager = SnapshotManager(root, keep=1)
+    first = snapshot.write_snapshot(corpus(1), {}, {}, root=root)
+    manager.reload(background=False)
+
+    with manager.acquire() as pinned:
+        snapshot.write_snapshot(corpus(2), {}, {}, root=root)
+        third = snapshot.write_snapshot(corpus(3), {}, {}, root=root)
+        manager.reload(background=False)
+
+        # The running query keeps its snapshot, both in memory and on disk
+        assert pinned.version == first
+        assert all(link.startswith('v1/') for link, _ in pinned.search(['t1']))
+        assert first in snapshot.list_versions(root)
+        assert manager.current.version == third
+
+    # Once released, everything but the current and the `keep` newest versions goes
+    manager.collect_garbage()
+    assert snapshot.list_versions(root) == [third]
+
+
+def test_publish_dataset_writes_only_when_the_dataset_is_newer(tmp_path):
+    root = str(tmp_path / "snapshots")
+    dataset_file = tmp_path / "dataset.json"
+    dataset_file.write_text('[{"link": "a", "vector": "[\'x\', \'y\']"}]')
+
+    version = snapshot.publish_dataset(str(dataset_file), root)
+    assert snapshot.publish_dataset(str(dataset_file), root) == version
+
+    later = os.path.getmtime(os.path.join(root, version, snapshot.DOCUMENTS_FILE)) + 10
+    os.utime(dataset_file, (later, later))
+    assert snapshot.publish_dataset(str(dataset_file), root) != version
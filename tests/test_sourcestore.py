@@ -0,0 +1,53 @@
+import random
+
+import pytest
+
+from utils.sourcestore import SourceStore
+
+
+@pytest.fixture
+def source():
+    return ''.join(f"line_{number} = {number}\n" for number in range(1, 101))
+
+
+@pytest.mark.parametrize("lines_per_block", [1, 3, 7, 64, 200])
+def test_get_lines_matches_slicing(tmp_path, source, lines_per_block):
+    store = SourceStore(str(tmp_path), lines_per_block=lines_per_block)
+    store.add("repo/file.py", source)
+    lines = source.splitlines(keepends=True)
+
+    rng = random.Random(lines_per_block)
+    ranges = [(1, None), (1, 1), (100, 100), (0, 5), (95, 130), (50, 49)]
+    ranges += [tuple(sorted(rng.sample(range(1, 101), 2))) for _ in range(50)]
+    for start_line, end_line in ranges:
+        stop = len(lines) if end_line is None else end_line
+        expected = ''.join(lines[max(1, start_line) - 1:stop])
+        assert store.get_lines("repo/file.py", start_line, end_line) == expected, (start_line, end_line)
+
+
+def test_chunk_links_resolve_to_their_range(tmp_path, source):
+    store = SourceStore(str(tmp_path), lines_per_block=8)
+    store.add("repo/file.py", source)
+    lines = source.splitlines(keepends=True)
+
+    assert store.get("repo/file.py#L10-L24") == ''.join(lines[9:24])
+    assert "repo/file.py#L10-L24" in store
+    assert store.get("repo/other.py#L1-L2") is None
+
+
+def test_store_survives_reopening_and_compaction(tmp_path, source):
+    store = SourceStore(str(tmp_path), lines_per_block=8)
+    store.add("a.py", source)
+    store.add("b.py", "print('b')\n")
+    assert not store.add("a.py", source)  # unchanged content writes nothing
+    assert store.garbage_bytes() == 0
+
+    store.add("a.py", source + "extra = 1\n")
+    assert store.garbage_bytes() > 0
+    store.save()
+
+    reopened = SourceStore(str(tmp_path))
+    assert reopened.compact() > 0
+    assert reopened.garbage_bytes() == 0
+    assert SourceStore(str(tmp_path)).get("a.py") == source + "extra = 1\n"
+    assert SourceStore(str(tmp_path)).get("b.py") == "print('b')\n"
@@ -0,0 +1,306 @@
+import heapq
+import os
+import threading
+from collections import OrderedDict
+from utils import dataset
+from utils import ranking
+from utils import snapshot
+
+# Rough CPython footprint of a loaded index, calibrated on dataset.json
+BYTES_PER_TOKEN = 40
+BYTES_PER_POSTING = 150
+BYTES_PER_TERM = 200
+# ... and of the shared statistics of a federated set: summed df per term, global norm per document
+BYTES_PER_FEDERATED_TERM = 40
+BYTES_PER_FEDERATED_DOCUMENT = 100
+
+
+def estimate_memory(loaded):
+    """
+    Estimate the memory held by a loaded Snapshot in bytes.
+    """
+    tokens = sum(len(tokens) for tokens in loaded.documents.values())
+    postings = sum(len(info['documents']) for info in loaded.index.inverted_index.values())
+    terms = len(loaded.index.inverted_index)
+    return tokens * BYTES_PER_TOKEN + postings * BYTES_PER_POSTING + terms * BYTES_PER_TERM
+
+
+def load_dataset_file(name, filename, repos_file="repos.csv"):
+    """
+    Load a dataset.json style file as a Snapshot named `name`, with the
+    repository metadata of `repos_file` attached to its documents.
+    """
+    documents, parents, document_metadata = dataset.load_documents(filename, repos_file)
+    return snapshot.Snapshot(name, documents, parents, document_metadata)
+
+
+class _GlobalStatistics:
+    """
+    Presents one index with document frequencies and a document count summed
+    over several indexes, so scores from different indexes are comparable.
+
+    Postings and term frequencies stay those of the index: a term absent from
+    it has no postings here, but still counts in the query norm, exactly as it
+    would in one index holding every corpus.
+    """
+
+    def __init__(self, index, document_frequencies, total_documents):
+        self.index = index
+        self.document_frequencies = document_frequencies
+        self.total_documents = total_documents
+
+    def get_documents(self, token):
+        return self.index.get_documents(token)
+
+    def get_document_frequency(self, token):
+        return self.document_frequencies.get(token, 0)
+
+    def get_term_frequency(self, document_link, token):
+        return self.index.get_term_frequency(document_link, token)
+
+    def get_total_documents(self):
+        return self.total_documents
+
+
+class IndexCatalog:
+    """
+    A catalog of named indexes that are loaded on first use and evicted in
+    least recently used order when their estimated memory exceeds a budget.
+
+    An index is registered from either a dataset.json style file or a snapshot
+    directory (see utils.snapshot); all of them are searched with the same
+    ranking code.
+    """
+
+    def __init__(self, memory_budget=512 * 1024 * 1024):
+        """
+        :param memory_budget: Estimated bytes the loaded indexes may hold together
+        """
+        self.memory_budget = memory_budget
+        self.sources = {}           # name -> dataset file or snapshot directory
+        self.loaded = OrderedDict()  # name -> (Snapshot, estimated bytes), least recently used first
+        self.memory = 0
+        self.loads = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._loading = {}          # name -> lock, so one index is never loaded twice at once
+        self._pinned = {}           # name -> number of federated searches using it
+        self._generations = {}      # name -> value of `loads` when it was loaded
+        self._federation = None     # (stamp, statistics, estimated bytes) of the last federated set
+
+    def register(self, name, source):
+        """
+        Add an index to the catalog without loading it.
+
+        :param name: Name used to query the index
+        :param source: Path of a dataset.json style file or of a snapshot directory
+        """
+        with self._lock:
+            if name in self.loaded and self.sources.get(name) != source:
+                self._drop(name)
+            self.sources[name] = source
+            self._loading.setdefault(name, threading.Lock())
+
+    def names(self):
+        return list(self.sources)
+
+    def _load(self, name):
+        source = self.sources[name]
+        if os.path.isdir(source):
+            version = snapshot.current_version(source)
+            if version is None:
+                raise FileNotFoundError(f"No current snapshot in {source}")
+            return snapshot.Snapshot.load(version, source)
+        return load_dataset_file(name, source)
+
+    def get(self, name):
+        """
+        Return the loaded index `name`, loading it and evicting others if needed.
+
+        :param name: A registered name
+        :return: The Snapshot of the index
+        """
+        if name not in self.sources:
+            raise KeyError(f"Unknown index: {name}")
+
+        with self._lock:
+            if name in self.loaded:
+                self.loaded.move_to_end(name)
+                return self.loaded[name][0]
+            loading = self._loading[name]
+
+        with loading:
+            with self._lock:
+                if name in self.loaded:
+                    self.loaded.move_to_end(name)
+                    return self.loaded[name][0]
+
+            # Loading is slow; other indexes stay searchable meanwhile
+            loaded = self._load(name)
+            size = estimate_memory(loaded)
+
+            with self._lock:
+                self.loaded[name] = (loaded, size)
+                self.memory += size
+                self.loads += 1
+                self._generations[name] = self.loads
+                self._evict_over_budget(keep=name)
+            return loaded
+
+    def _evict_over_budget(self, keep=None):
+        # Called with the lock held; pinned indexes and `keep` are never evicted.
+        # Federated statistics are cheaper to recompute than an index is to reload, so they go first
+        if self.memory > self.memory_budget and self._federation is not None \
+                and not any(self._pinned.get(member) for member, _ in self._federation[0]):
+            self._forget_federation()
+        for evicted in list(self.loaded):
+            if self.memory <= self.memory_budget:
+                break
+            if evicted == keep or self._pinned.get(evicted):
+                continue
+            self._drop(evicted)
+            self.evictions += 1
+
+    def _drop(self, name):
+        # Called with the lock held
+        _, size = self.loaded.pop(name)
+        self.memory -= size
+        # The cached federated statistics reference the index and would keep it in memory
+        if self._federation is not None and any(member == name for member, _ in self._federation[0]):
+            self._forget_federation()
+
+    def _forget_federation(self):
+        # Called with the lock held
+        if self._federation is not None:
+            self.memory -= self._federation[2]
+            self._federation = None
+
+    def evict(self, name):
+        """
+        Drop a loaded index from memory; it is loaded again on its next use.
+        """
+        with self._lock:
+            if name in self.loaded:
+                self._drop(name)
+
+    def search(self, name, query, top_k=10, filters=None):
+        """
+        Search one index.
+
+        :param name: A registered name
+        :param query: Vectorized query
+        :param filters: Metadata conditions, see MetadataIndex.filter
+        :return: List of (link, score) pairs, best first
+        """
+        return self.get(name).search(query, top_k, filters=filters)
+
+    def _global_statistics(self, indexes):
+        """
+        Build the shared statistics of a set of loaded indexes: one view per
+        index with the summed document frequencies and document count, and the
+        document norms of each index recomputed under those statistics.
+
+        Computing the norms walks every document, so the result is kept for the
+        last federated set and reused until one of its indexes is reloaded. Its
+        estimated size counts towards the memory budget like a loaded index.
+        """
+        with self._lock:
+            stamp = tuple(sorted((name, self._generations.get(name)) for name in indexes))
+            if self._federation is not None and self._federation[0] == stamp:
+                return self._federation[1]
+
+        total = sum(loaded.index.get_total_documents() for loaded in indexes.values())
+        frequencies = {}
+        for loaded in indexes.values():
+            for term, info in loaded.index.inverted_index.items():
+                frequencies[term] = frequencies.get(term, 0) + len(info['documents'])
+
+        statistics = {}
+        for name, loaded in indexes.items():
+            view = _GlobalStatistics(loaded.index, frequencies, total)
+            norms = ranking.compute_document_norms(loaded.documents, view, loaded.documents)
+            statistics[name] = (view, norms)
+
+        size = (len(frequencies) * BYTES_PER_FEDERATED_TERM
+                + sum(len(norms) for _, norms in statistics.values()) * BYTES_PER_FEDERATED_DOCUMENT)
+        with self._lock:
+            self._forget_federation()
+            self._federation = (stamp, statistics, size)
+            self.memory += size
+        return statistics
+
+    def federated_search(self, query, names=None, top_k=10, global_statistics=True, filters=None):
+        """
+        Search several indexes and merge their results.
+
+        With `global_statistics` every idf, for the query and for the document
+        norms, is computed from the document frequencies and document counts of
+        all searched indexes together. A document then gets the score it would
+        get in a single index holding all of them, so scores from different
+        indexes are comparable and a term rare in one corpus but common overall
+        is not over-weighted.
+
+        The searched indexes are pinned until the search is done, so loading
+        one never evicts another of the same search. If together they exceed
+        the memory budget, a warning is printed and the budget is enforced
+        afterwards, which means the next federated search reloads some of them.
+
+        :param query: Vectorized query
+        :param names: Indexes to search, all registered ones by default
+        :param top_k: Number of merged results
+        :param global_statistics: Share document statistics across the searched indexes
+        :param filters: Metadata conditions applied in every index
+        :return: List of (name, link, score) triples, best first
+        """
+        names = list(dict.fromkeys(names or self.sources))
+        with self._lock:
+            for name in names:
+                self._pinned[name] = self._pinned.get(name, 0) + 1
+        try:
+            indexes = {name: self.get(name) for name in names}
+
+            results = []
+            if global_statistics and any(loaded.vectorizer is not None for loaded in indexes.values()):
+                raise ValueError("Global statistics cannot be shared by snapshots indexing hashed features")
+            if global_statistics:
+                for name, (view, norms) in self._global_statistics(indexes).items():
+                    candidates = indexes[name].metadata_index.filter_links(**filters) if filters else None
+                    for link, score in ranking.search(query, norms, top_k, candidates, index=view):
+                        results.append((name, link, score))
+            else:
+                for name, loaded in indexes.items():
+                    for link, score in loaded.search(query, top_k, filters=filters):
+                        results.append((name, link, score))
+        finally:
+            with self._lock:
+                for name in names:
+                    self._pinned[name] -= 1
+                    if not self._pinned[name]:
+                        del self._pinned[name]
+                needed = sum(self.loaded[name][1] for name in names if name in self.loaded)
+                if global_statistics and self._federation is not None:
+                    needed += self._federation[2]
+                if needed > self.memory_budget:
+                    print(f"Federated search over {len(names)} indexes needs about {needed} bytes, more than the "
+                          f"memory budget of {self.memory_budget}; they will be reloaded on every search")
+                self._evict_over_budget()
+
+        return heapq.nlargest(top_k, results, key=lambda result: result[2])
+
+    def stats(self):
+        """
+        Report registered and loaded indexes, estimated memory, loads and evictions.
+        """
+        with self._lock:
+            return {
+                'registered': len(self.sources),
+                'loaded': list(self.loaded),
+                'memory': self.memory,
+                'federation_memory': self._federation[2] if self._federation is not None else 0,
+                'memory_budget': self.memory_budget,
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
+
+
+catalog = IndexCatalog()
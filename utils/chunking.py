@@ -0,0 +1,120 @@
+import ast
+
+
+def chunk_link(link, start_line, end_line):
+    """
+    Build the address of a chunk from the URL of its parent file.
+
+    Args:
+    link (str): The URL of the parent file.
+    start_line (int): First line of the chunk (1-based).
+    end_line (int): Last line of the chunk (inclusive).
+
+    Returns:
+    str: The parent URL with a GitHub style line range anchor, e.g. '...py#L10-L24'.
+    """
+    return f"{link}#L{start_line}-L{end_line}"
+
+
+def parent_link(link):
+    """
+    Return the URL of the file a chunk belongs to (the link itself for whole files).
+    """
+    return link.split('#L', 1)[0]
+
+
+def _node_start(node):
+    # Decorators belong to the function or class they decorate
+    lines = [node.lineno] + [decorator.lineno for decorator in getattr(node, 'decorator_list', [])]
+    return min(lines)
+
+
+def _definition_spans(tree):
+    """
+    Collect (name, kind, start_line, end_line) for every unit worth indexing on its own.
+
+    Top-level functions become one unit each. Classes are split into their methods
+    so a large class does not turn into a single document again; a class without
+    methods is kept whole.
+    """
+    spans = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            spans.append((node.name, 'function', _node_start(node), node.end_lineno))
+        elif isinstance(node, ast.ClassDef):
+            methods = [child for child in node.body if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))]
+            if not methods:
+                spans.append((node.name, 'class', _node_start(node), node.end_lineno))
+                continue
+            # The class header and attributes up to the first method form their own unit
+            first_method_start = _node_start(methods[0])
+            if first_method_start > _node_start(node):
+                spans.append((node.name, 'class', _node_start(node), first_method_start - 1))
+            for method in methods:
+                spans.append((f"{node.name}.{method.name}", 'method', _node_start(method), method.end_lineno))
+    return spans
+
+
+def _line_windows(lines, start_line, end_line, window, overlap, name='module'):
+    """
+    Split the lines [start_line, end_line] into fixed windows, skipping blank windows.
+    """
+    chunks = []
+    step = max(1, window - overlap)
+    line = start_line
+    while line <= end_line:
+        last = min(end_line, line + window - 1)
+        source = '\n'.join(lines[line - 1:last])
+        if source.strip():
+            chunks.append({'name': name, 'kind': 'lines', 'start_line': line, 'end_line': last, 'source': source})
+        if last == end_line:
+            break
+        line += step
+    return chunks
+
+
+def chunk_source(code_content, window=40, overlap=10):
+    """
+    Split a Python source file into function/class level chunks with line ranges.
+
+    The source is parsed once with `ast`. Code outside any function or class is
+    grouped into line windows. Files that do not parse (Python 2 code, templates,
+    partial files) fall back to line windows over the whole file.
+
+    Args:
+    code_content (str): The source text of the file.
+    window (int): Number of lines per window for code that is not in a definition.
+    overlap (int): Number of lines shared by consecutive windows.
+
+    Returns:
+    list of dict: Chunks with keys 'name', 'kind', 'start_line', 'end_line' and
+                  'source', ordered by start line.
+    """
+    lines = code_content.splitlines()
+    if not lines:
+        return []
+
+    try:
+        tree = ast.parse(code_content)
+    except (SyntaxError, ValueError):
+        return _line_windows(lines, 1, len(lines), window, overlap)
+
+    chunks = []
+    covered_until = 0
+    for name, kind, start_line, end_line in _definition_spans(tree):
+        # Module level code between definitions
+        if start_line > covered_until + 1:
+            chunks.extend(_line_windows(lines, covered_until + 1, start_line - 1, window, overlap))
+        chunks.append({
+            'name': name,
+            'kind': kind,
+            'start_line': start_line,
+            'end_line': end_line,
+            'source': '\n'.join(lines[start_line - 1:end_line]),
+        })
+        covered_until = max(covered_until, end_line)
+
+    if covered_until < len(lines):
+        chunks.extend(_line_windows(lines, covered_until + 1, len(lines), window, overlap))
+
+    return chunks
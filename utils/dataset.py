@@ -4,9 +4,17 @@ import os
 import pandas as pd
 from codeparser import parser
 from codescraper import scraper
+from utils import chunking
+from utils import metadata as repository_metadata
 from utils.invertedindex import inverted_index
+from utils.metadata import metadata_index
+from utils.positionalindex import positional_index
+from utils.sourcestore import source_store
+from utils.tokencache import token_cache
 
 documents = {}
+parents = {}  # chunk link -> link of the file it was cut from
+metadata = {}  # link -> repository metadata from repos.csv
 
 def add_entry_to_json_file(link, vector, filename="dataset.json"):
     """
@@ -38,6 +46,31 @@ def add_entry_to_json_file(link, vector, filename="dataset.json"):
         json.dump(data, file, indent=4)
 
 
+def add_entries_to_json_file(entries, filename="dataset.json"):
+    """
+    Add several entries to a JSON file of objects with members 'link' and 'vector'
+    with a single read and write of the file.
+
+    Args:
+    entries (list of dict): The entries to be added, e.g. the chunks of one file
+                            with members 'link', 'vector' and 'parent'.
+    filename (str): The name of the JSON file.
+    """
+    if not entries:
+        return
+
+    if os.path.exists(filename):
+        with open(filename, 'r') as file:
+            data = json.load(file)
+    else:
+        data = []
+
+    data.extend(entries)
+
+    with open(filename, 'w') as file:
+        json.dump(data, file, indent=4)
+
+
 def extract_link_vector_pairs(filename="dataset.json"):
     """
     Extracts link-vector pairs from a JSON file.
@@ -69,6 +102,44 @@ def extract_link_vector_pairs(filename="dataset.json"):
     return pairs
 
 
+def extract_chunk_parents(filename="dataset.json"):
+    """
+    Extracts the chunk-to-file links from a JSON file.
+
+    Args:
+    filename (str): The name of the JSON file.
+
+    Returns:
+    dict: Maps the link of every chunk entry to the link of its parent file.
+    """
+    try:
+        with open(filename, 'r') as file:
+            data = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+    return {entry['link']: entry['parent'] for entry in data if entry.get('link') and entry.get('parent')}
+
+
+def load_documents(filename="dataset.json", repos_file="repos.csv"):
+    """
+    Read a dataset.json style file without indexing it.
+
+    Args:
+    filename (str): The name of the JSON file.
+    repos_file (str): The CSV file of repository metadata.
+
+    Returns:
+    tuple: (documents, parents, metadata) dictionaries, shaped like the module
+           level ones `init` fills, e.g. to write a snapshot.
+    """
+    documents = {link: ast.literal_eval(vector) if isinstance(vector, str) else vector
+                 for link, vector in extract_link_vector_pairs(filename)}
+    repositories = repository_metadata.load_repository_metadata(repos_file)
+    metadata = {link: repository_metadata.document_metadata(link, repositories) for link in documents}
+    return documents, extract_chunk_parents(filename), metadata
+
+
 def extract_repo_url_at_line(line_number, file_path="repos.csv"):
     try:
         # Read the CSV file
@@ -87,24 +158,74 @@ def extract_repo_url_at_line(line_number, file_path="repos.csv"):
         return None
     
 
-def download_files(github_token, number_of_repos):
+def download_files(github_token, number_of_repos, chunk=False):
+    """
+    Download the Python files of the first repositories in repos.csv and add them to dataset.json.
+
+    Args:
+    github_token (str): GitHub token for API authentication.
+    number_of_repos (int): How many repositories of repos.csv to download.
+    chunk (bool): Index every function/class of a file as its own sub-document
+                  (see utils.chunking) instead of the whole file.
+    """
     for i in range(0, number_of_repos):
         github_url = extract_repo_url_at_line(i)
         python_files = scraper.get_py_files(github_url, github_token)
         
         for file in python_files:
             file_content = scraper.get_file_content(file)
-            parser.add_entry_to_json_file(file, str(parser.vectorize(file_content)))
+            if file_content is None:
+                continue
+            source_store.add(file, file_content)
+            if not chunk:
+                parser.add_entry_to_json_file(file, str(token_cache.vectorize(file_content)))
+                continue
+            chunks = []
+            for piece in chunking.chunk_source(file_content):
+                tokens = token_cache.vectorize(piece['source'])
+                if tokens:
+                    link = chunking.chunk_link(file, piece['start_line'], piece['end_line'])
+                    chunks.append({"link": link, "vector": str(tokens), "parent": file})
+            # One rewrite of the dataset per file, not per chunk
+            add_entries_to_json_file(chunks)
+
+    token_cache.save()
+    stats = token_cache.stats()
+    print(f"Token cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+          f"{stats['entries']} entries, {stats['bytes']} bytes")
+    source_store.save()
+    # Files whose content changed leave their old blocks behind
+    if source_store.garbage_bytes() > source_store.live_bytes():
+        source_store.compact()
             
-def init():
+def init(positional=False):
+    """
+    Load dataset.json into the inverted index and the documents dictionary.
+
+    Args:
+    positional (bool): Also build utils.positionalindex.positional_index, needed for
+                       phrase and n-gram queries.
+
+    Returns:
+    list of tuples: The (link, vector) pairs read from dataset.json.
+    """
 
     link_vector_pairs = extract_link_vector_pairs()
+    repositories = repository_metadata.load_repository_metadata()
 
     for pair in link_vector_pairs:
         link, tokens_str = pair
         tokens = ast.literal_eval(tokens_str)  # Convert the string to a list
         inverted_index.update_index(link, tokens)
+        if positional:
+            positional_index.update_index(link, tokens)
         documents[link] = tokens
+
+        metadata[link] = repository_metadata.document_metadata(link, repositories)
+        metadata_index.add_document(link, metadata[link])
+
+    parents.update(extract_chunk_parents())
+    inverted_index.compute_stop_tokens()
         
     return link_vector_pairs
 
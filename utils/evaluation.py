@@ -0,0 +1,435 @@
+"""
+Offline relevance and latency evaluation of Scouty's retrieval modes.
+
+Judgments (a query plus the documents it should retrieve) are read from a JSON
+file or generated by cutting token windows out of indexed documents and
+mutating them the way copied code usually changes: identifiers get renamed and
+statements get reordered. Every available search mode then answers every
+query, and MRR, recall@k and nDCG@k are reported next to per-query latency
+and memory, so a faster approximate mode can be accepted or rejected with data.
+With --against-exact the overlap of every mode's top k with exhaustive search
+is reported as well.
+
+Usage (from the repository root):
+
+    python -m utils.evaluation --queries 200 --k 10
+    python -m utils.evaluation --judgments judgments.json --modes exact impact lsi
+    python -m utils.evaluation --modes impact reduced --against-exact
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+import tracemalloc
+from codeparser import parser
+from utils import dataset
+from utils import ranking
+
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def rename_identifiers(tokens, rng, fraction=0.5):
+    """
+    Consistently rename a fraction of the plain identifiers of a token window.
+
+    Args:
+    tokens (list of str): Token window.
+    rng (random.Random): Source of randomness.
+    fraction (float): Share of the distinct identifiers that get renamed.
+
+    Returns:
+    list of str: The window with every occurrence of a chosen identifier replaced.
+    """
+    identifiers = sorted({token for token in tokens if IDENTIFIER.match(token)})
+    chosen = rng.sample(identifiers, int(len(identifiers) * fraction))
+    renamed = {identifier: f"{identifier}_{rng.randrange(1000)}" for identifier in chosen}
+    return [renamed.get(token, token) for token in tokens]
+
+
+def reorder_statements(tokens, rng, block=6):
+    """
+    Swap neighbouring blocks of tokens, mimicking reordered statements.
+
+    The token stream has no line breaks, so a statement is taken to start at
+    the target of each assignment; windows without enough assignments are cut
+    into fixed-size blocks instead.
+    """
+    starts = sorted({0, *(i for i in range(len(tokens) - 1) if tokens[i + 1] == '=')})
+    if len(starts) < 3:
+        starts = list(range(0, len(tokens), block))
+    blocks = [tokens[start:end] for start, end in zip(starts, starts[1:] + [len(tokens)])]
+    for i in range(0, len(blocks) - 1, 2):
+        if rng.random() < 0.5:
+            blocks[i], blocks[i + 1] = blocks[i + 1], blocks[i]
+    return [token for piece in blocks for token in piece]
+
+
+MUTATIONS = {
+    'exact': lambda tokens, rng: list(tokens),
+    'rename': rename_identifiers,
+    'reorder': reorder_statements,
+    'rename+reorder': lambda tokens, rng: reorder_statements(rename_identifiers(tokens, rng), rng),
+}
+
+
+def generate_judgments(n_queries=100, length=30, mutations=('rename', 'reorder', 'rename+reorder'), seed=0, documents=None):
+    """
+    Generate query/relevant-document judgments from the indexed documents.
+
+    Args:
+    n_queries (int): Number of judgments.
+    length (int): Number of tokens cut out of a document for a query.
+    mutations (tuple of str): Keys of MUTATIONS, applied round robin.
+    seed (int): Seed for reproducible judgments.
+    documents (dict): Maps links to token lists, dataset.documents by default.
+
+    Returns:
+    list of dict: Judgments with keys 'query' (tokens), 'relevant' (links) and 'mutation'.
+    """
+    documents = dataset.documents if documents is None else documents
+    rng = random.Random(seed)
+    links = sorted(link for link, tokens in documents.items() if len(tokens) >= length)
+    judgments = []
+
+    for i in range(n_queries):
+        if not links:
+            break
+        link = rng.choice(links)
+        tokens = documents[link]
+        start = rng.randrange(len(tokens) - length + 1)
+        mutation = mutations[i % len(mutations)]
+        judgments.append({
+            'query': MUTATIONS[mutation](tokens[start:start + length], rng),
+            'relevant': [link],
+            'mutation': mutation,
+        })
+    return judgments
+
+
+def load_judgments(filename):
+    """
+    Read judgments from a JSON list of {'query', 'relevant'} objects. A query may
+    be given as source code, in which case it is vectorized.
+    """
+    with open(filename, 'r') as file:
+        judgments = json.load(file)
+    for judgment in judgments:
+        if isinstance(judgment['query'], str):
+            judgment['query'] = parser.vectorize(judgment['query'])
+    return judgments
+
+
+def reciprocal_rank(results, relevant):
+    for rank, link in enumerate(results, start=1):
+        if link in relevant:
+            return 1 / rank
+    return 0.0
+
+
+def recall_at(results, relevant, k):
+    return len(set(results[:k]) & relevant) / len(relevant) if relevant else 0.0
+
+
+def ndcg_at(results, relevant, k):
+    dcg = sum(1 / math.log2(rank + 1) for rank, link in enumerate(results[:k], start=1) if link in relevant)
+    ideal = sum(1 / math.log2(rank + 1) for rank in range(1, min(k, len(relevant)) + 1))
+    return dcg / ideal if ideal else 0.0
+
+
+class LsiSearch:
+    """
+    Search function of the 'lsi' mode, owning the directory of its index files.
+    """
+
+    def __init__(self, document_norms, directory=None):
+        """
+        :param document_norms: Norms of the global index, used to rerank candidates
+        :param directory: Where to build the index files; a temporary directory
+                          removed by `close` (or when this object is collected) if None
+        """
+        from utils.lsi import LatentSemanticIndex
+        self.document_norms = document_norms
+        self._temporary = tempfile.TemporaryDirectory(prefix='scouty-lsi-') if directory is None else None
+        self.index = LatentSemanticIndex.build(directory or self._temporary.name)
+
+    def __call__(self, query, k):
+        return [link for link, _ in self.index.search(query, self.document_norms, k)]
+
+    def close(self):
+        if self._temporary is not None:
+            self._temporary.cleanup()
+            self._temporary = None
+
+
+def build_modes(names=None, document_norms=None, workdir=None, vectorizer=None):
+    """
+    Build the search modes to compare. Each mode is a function (query, top_k) -> links.
+
+    Modes whose optional dependency is missing are skipped with a message.
+
+    Args:
+    names (list of str): Modes to build, all of them by default.
+    document_norms (dict): Norms of the global index, computed if not given.
+    workdir (str): Directory for on-disk index files (lsi). Without one, a
+                   temporary directory is created that is removed once the
+                   mode is garbage collected or the interpreter exits.
+    vectorizer (HashingVectorizer): Vectorizer of the 'hashed' mode, the default one if not given.
+
+    Returns:
+    dict: Maps mode names to (search function, build seconds, build memory in bytes).
+    """
+    if document_norms is None:
+        document_norms = ranking.compute_document_norms(dataset.documents)
+
+    def exact():
+        return lambda query, k: [link for link, _ in ranking.search(query, document_norms, k)]
+
+    def reduced():
+        from utils import queryreduction
+        return lambda query, k: [link for link, _ in
+                                 ranking.search(queryreduction.reduce_query(query, max_repeats=2), document_norms, k)]
+
+    def impact():
+        from utils.impactindex import ImpactIndex
+        impact_index = ImpactIndex.build(document_norms)
+        budget = max(100, impact_index.total_postings() // 100)
+        return lambda query, k: [link for link, _ in impact_index.search(query, k, max_postings=budget)[0]]
+
+    def champions():
+        from utils.impactindex import ImpactIndex
+        impact_index = ImpactIndex.build(document_norms)
+        return lambda query, k: [link for link, _ in impact_index.search(query, k, tiers=1)[0]]
+
+    def ngram():
+        from utils.positionalindex import PositionalIndex
+        positional = PositionalIndex()
+        for link, tokens in dataset.documents.items():
+            positional.update_index(link, tokens)
+        return lambda query, k: [link for link, _ in positional.ngram_search(query, n=3, top_k=k)]
+
+    def lsi():
+        return LsiSearch(document_norms, os.path.join(workdir, 'lsi') if workdir is not None else None)
+
+    def hashed():
+        from utils.hashing import HashedIndex, HashingVectorizer
+        hashed_index = HashedIndex(vectorizer or HashingVectorizer())
+        return lambda query, k: [link for link, _ in hashed_index.search(query, k)]
+
+    builders = {'exact': exact, 'reduced': reduced, 'impact': impact, 'champions': champions,
+                'ngram': ngram, 'lsi': lsi, 'hashed': hashed}
+
+    modes = {}
+    for name in names or builders:
+        if name not in builders:
+            raise ValueError(f"Unknown mode {name}, expected one of {sorted(builders)}")
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            search = builders[name]()
+        except ImportError as e:
+            print(f"Skipping mode {name}: {e}")
+            continue
+        finally:
+            build_seconds = time.perf_counter() - start
+            _, build_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        modes[name] = (search, build_seconds, build_peak)
+    return modes
+
+
+def latency_summary(latencies):
+    """
+    Mean and percentiles of a list of latencies in ms.
+    """
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) >= 2 else latencies * 99
+    return {
+        'mean': statistics.fmean(latencies) if latencies else 0.0,
+        'p50': quantiles[49] if quantiles else 0.0,
+        'p95': quantiles[94] if quantiles else 0.0,
+        'p99': quantiles[98] if quantiles else 0.0,
+    }
+
+
+def evaluate(judgments, modes, k=10):
+    """
+    Run every judgment through every mode.
+
+    Latency is measured in a first pass without memory tracing; per-query
+    memory (peak of Python allocations while answering) in a second pass,
+    since tracing slows every allocation down.
+
+    Args:
+    judgments (list of dict): Judgments, see `generate_judgments`.
+    modes (dict): Output of `build_modes`.
+    k (int): Cut-off for recall and nDCG.
+
+    Returns:
+    dict: Per mode: mrr, recall@k, ndcg@k, latency percentiles in ms, mean and
+          max query memory in KiB, and build time and memory.
+    """
+    report = {}
+    for name, (search, build_seconds, build_peak) in modes.items():
+        reciprocal_ranks, recalls, ndcgs, latencies, memory = [], [], [], [], []
+
+        for judgment in judgments:
+            relevant = set(judgment['relevant'])
+            start = time.perf_counter()
+            results = search(judgment['query'], k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            reciprocal_ranks.append(reciprocal_rank(results, relevant))
+            recalls.append(recall_at(results, relevant, k))
+            ndcgs.append(ndcg_at(results, relevant, k))
+
+        tracemalloc.start()
+        for judgment in judgments:
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            search(judgment['query'], k)
+            memory.append((tracemalloc.get_traced_memory()[1] - baseline) / 1024)
+        tracemalloc.stop()
+
+        n = max(1, len(judgments))
+        report[name] = {
+            'mrr': sum(reciprocal_ranks) / n,
+            f'recall@{k}': sum(recalls) / n,
+            f'ndcg@{k}': sum(ndcgs) / n,
+            'latency_ms': latency_summary(latencies),
+            'query_memory_kib': {'mean': statistics.fmean(memory) if memory else 0.0, 'max': max(memory, default=0.0)},
+            'build_s': build_seconds,
+            'build_memory_kib': build_peak / 1024,
+        }
+    return report
+
+
+def compare_to_exact(queries, modes, k=10, document_norms=None):
+    """
+    Measure how closely every mode reproduces exhaustive search.
+
+    Args:
+    queries (list of list of str): Vectorized queries.
+    modes (dict): Output of `build_modes`.
+    k (int): Cut-off of both rankings.
+    document_norms (dict): Norms of the global index, computed if not given.
+
+    Returns:
+    dict: Per mode: mean overlap@k of its top k with the exhaustive top k
+          (queries without any exact result are skipped) and latency
+          percentiles in ms, next to those of the exhaustive search under 'exact'.
+    """
+    if 'exact' in modes:
+        exact_search = modes['exact'][0]
+    else:
+        exact_search = build_modes(['exact'], document_norms)['exact'][0]
+
+    expected, exact_latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        expected.append(set(exact_search(query, k)))
+        exact_latencies.append((time.perf_counter() - start) * 1000)
+
+    report = {'exact': {f'overlap@{k}': 1.0, 'latency_ms': latency_summary(exact_latencies)}}
+    for name, (search, _, _) in modes.items():
+        if name == 'exact':
+            continue
+        overlaps, latencies = [], []
+        for query, relevant in zip(queries, expected):
+            start = time.perf_counter()
+            results = search(query, k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if relevant:
+                overlaps.append(len(relevant & set(results[:k])) / len(relevant))
+        report[name] = {
+            f'overlap@{k}': sum(overlaps) / len(overlaps) if overlaps else 0.0,
+            'latency_ms': latency_summary(latencies),
+        }
+    return report
+
+
+def format_overlap_report(report, k=10):
+    """
+    Render the output of `compare_to_exact` as a fixed-width table.
+    """
+    header = f"{'mode':<10} {f'overlap@{k}':>10} {'mean ms':>8} {'p95 ms':>8} {'speedup':>8}"
+    lines = [header, '-' * len(header)]
+    exact_mean = report['exact']['latency_ms']['mean']
+    for name, row in report.items():
+        mean = row['latency_ms']['mean']
+        speedup = f"{exact_mean / mean:>7.1f}x" if mean else f"{'-':>8}"
+        lines.append(f"{name:<10} {row[f'overlap@{k}']:>10.3f} {mean:>8.3f} {row['latency_ms']['p95']:>8.3f} {speedup}")
+    return '\n'.join(lines)
+
+
+def format_report(report, k=10):
+    """
+    Render a report as a fixed-width table.
+    """
+    header = (f"{'mode':<10} {'MRR':>6} {f'R@{k}':>6} {f'nDCG@{k}':>8} {'mean ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'q KiB':>8} {'build s':>8} {'build MiB':>9}")
+    lines = [header, '-' * len(header)]
+    for name, row in report.items():
+        lines.append(
+            f"{name:<10} {row['mrr']:>6.3f} {row[f'recall@{k}']:>6.3f} {row[f'ndcg@{k}']:>8.3f} "
+            f"{row['latency_ms']['mean']:>8.3f} {row['latency_ms']['p95']:>8.3f} {row['latency_ms']['p99']:>8.3f} "
+            f"{row['query_memory_kib']['mean']:>8.1f} {row['build_s']:>8.2f} {row['build_memory_kib'] / 1024:>9.1f}"
+        )
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    argument_parser = argparse.ArgumentParser(description="Compare Scouty's retrieval modes on relevance and latency.")
+    argument_parser.add_argument('--judgments', help="JSON file of {'query', 'relevant'} judgments; generated if omitted")
+    argument_parser.add_argument('--save-judgments', help="Write the judgments used to this file")
+    argument_parser.add_argument('--queries', type=int, default=100, help="Number of generated judgments")
+    argument_parser.add_argument('--length', type=int, default=30, help="Tokens per generated query")
+    argument_parser.add_argument('--mutations', nargs='+', default=['rename', 'reorder', 'rename+reorder'],
+                                 choices=sorted(MUTATIONS))
+    argument_parser.add_argument('--modes', nargs='+', help="Modes to compare (default: all)")
+    argument_parser.add_argument('--k', type=int, default=10)
+    argument_parser.add_argument('--seed', type=int, default=0)
+    argument_parser.add_argument('--against-exact', action='store_true',
+                                 help="Also report every mode's overlap with exhaustive search")
+    argument_parser.add_argument('--buckets', type=int, default=1 << 18, help="Buckets of the 'hashed' mode")
+    argument_parser.add_argument('--rare-policy', default='keep', choices=['keep', 'drop', 'shared'],
+                                 help="Rare-token policy of the 'hashed' mode")
+    argument_parser.add_argument('--hashing-report', action='store_true',
+                                 help="Also report index sizes and bucket collisions of the 'hashed' mode")
+    argument_parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = argument_parser.parse_args(argv)
+
+    print("Initing Dataset...")
+    dataset.init()
+
+    if args.judgments:
+        judgments = load_judgments(args.judgments)
+    else:
+        judgments = generate_judgments(args.queries, args.length, tuple(args.mutations), args.seed)
+    if args.save_judgments:
+        with open(args.save_judgments, 'w') as file:
+            json.dump(judgments, file, indent=4)
+
+    vectorizer = None
+    if not args.modes or 'hashed' in args.modes or args.hashing_report:
+        from utils.hashing import HashingVectorizer
+        vectorizer = HashingVectorizer(args.buckets, rare_policy=args.rare_policy)
+
+    with tempfile.TemporaryDirectory(prefix='scouty-eval-') as workdir:
+        modes = build_modes(args.modes, workdir=workdir, vectorizer=vectorizer)
+        report = evaluate(judgments, modes, args.k)
+        print(json.dumps(report, indent=4) if args.json else format_report(report, args.k))
+
+        if args.against_exact:
+            overlap = compare_to_exact([judgment['query'] for judgment in judgments], modes, args.k)
+            print(json.dumps(overlap, indent=4) if args.json else format_overlap_report(overlap, args.k))
+
+        if args.hashing_report:
+            from utils.hashing import HashedIndex, memory_report
+            print(json.dumps(memory_report(HashedIndex(vectorizer)), indent=4))
+
+
+if __name__ == '__main__':
+    main()
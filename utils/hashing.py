@@ -0,0 +1,249 @@
+import hashlib
+import re
+import sys
+from array import array
+from collections import Counter
+from functools import lru_cache
+from utils import dataset
+from utils import invertedindex
+from utils import ranking
+from utils.invertedindex import InvertedIndex
+
+RARE_POLICIES = ('keep', 'drop', 'shared')
+# Document frequency counters saturate here; only counts below min_df matter
+MAX_SKETCH_COUNT = 255
+
+# Tokens keep trailing punctuation the parser did not split off, e.g. '0)' or '1,'
+NUMBER_LITERAL = re.compile(r"^[-+]?(0[xX][0-9a-fA-F_]+|\d[\d_]*\.?\d*([eE][-+]?\d+)?)[jJ]?[,)\]:}]*$")
+STRING_LITERAL = re.compile(r"^[bBrRuUfF]{0,2}['\"]")
+
+
+@lru_cache(maxsize=1 << 16)
+def _token_hash(token):
+    # Stable across processes, unlike hash(), so indexes and queries agree
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'little')
+
+
+class HashingVectorizer:
+    """
+    Maps the open-ended token vocabulary into a fixed number of buckets.
+
+    With signed hashing every token also gets a +1/-1 sign from its hash, and a
+    document's count for a bucket is the absolute value of the signed sum of
+    its tokens: two unrelated tokens colliding in the same bucket tend to cancel
+    out instead of inflating each other's counts. Bucket ids replace tokens as
+    index terms, so the inverted index never holds more than `n_buckets` (+1)
+    terms however many identifiers and literals the corpus contains.
+
+    Rare tokens are recognized with a count-min sketch of document frequencies
+    of `sketch_depth` x `sketch_width` one-byte counters, so the vectorizer's
+    own state is bounded as well. The sketch can only overestimate a frequency: a
+    rare token may occasionally be treated as a regular one, never the reverse.
+    """
+
+    def __init__(self, n_buckets=1 << 18, signed=True, rare_policy='keep', min_df=2, collapse_literals=False,
+                 sketch_depth=4, sketch_width=1 << 17):
+        """
+        :param n_buckets: Number of buckets (index terms)
+        :param signed: Use signed hashing
+        :param rare_policy: What to do with tokens seen in fewer than `min_df` documents by `fit`:
+                            'keep' hashes them like any token, 'drop' removes them and
+                            'shared' maps them all to one dedicated bucket
+        :param min_df: Document frequency below which a token is rare
+        :param collapse_literals: Replace number and string literals by '<num>' and '<str>'
+                                  before hashing
+        :param sketch_depth: Number of hash rows of the document frequency sketch
+        :param sketch_width: Counters per row; wider rows misjudge fewer rare tokens
+        """
+        if rare_policy not in RARE_POLICIES:
+            raise ValueError(f"rare_policy must be one of {RARE_POLICIES}")
+        if not 0 < min_df <= MAX_SKETCH_COUNT:
+            raise ValueError(f"min_df must be between 1 and {MAX_SKETCH_COUNT}")
+        self.n_buckets = n_buckets
+        self.signed = signed
+        self.rare_policy = rare_policy
+        self.min_df = min_df
+        self.collapse_literals = collapse_literals
+        self.sketch_depth = sketch_depth
+        self.sketch_width = sketch_width
+        self.rare_bucket = n_buckets  # one past the hashed range
+        self.document_frequencies = None  # count-min sketch, filled by fit
+
+    def normalize(self, token):
+        """
+        Apply literal collapsing to a token.
+        """
+        if self.collapse_literals:
+            if STRING_LITERAL.match(token):
+                return '<str>'
+            if NUMBER_LITERAL.match(token):
+                return '<num>'
+        return token
+
+    def fit(self, documents):
+        """
+        Find the rare tokens of a corpus for the rare-token policy.
+
+        :param documents: Iterable of token lists
+        :return: self
+        """
+        if self.rare_policy == 'keep':
+            return self
+
+        sketch = array('B', bytes(self.sketch_depth * self.sketch_width))
+        for tokens in documents:
+            for token in {self.normalize(token) for token in tokens}:
+                cells = self._sketch_cells(token)
+                estimate = min(sketch[cell] for cell in cells)
+                if estimate == MAX_SKETCH_COUNT:
+                    continue
+                # Conservative update: only the counters holding the estimate grow
+                for cell in cells:
+                    if sketch[cell] == estimate:
+                        sketch[cell] = estimate + 1
+        self.document_frequencies = sketch
+        return self
+
+    def _sketch_cells(self, token):
+        h = _token_hash(token)
+        # Double hashing derives the row hashes from the two halves of one hash
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [row * self.sketch_width + (h1 + row * h2) % self.sketch_width for row in range(self.sketch_depth)]
+
+    def is_rare(self, token):
+        """
+        Whether a (normalized) token was seen in fewer than `min_df` documents by `fit`.
+        """
+        if self.document_frequencies is None:
+            return False
+        return min(self.document_frequencies[cell] for cell in self._sketch_cells(token)) < self.min_df
+
+    def memory_bytes(self):
+        """
+        Approximate memory of the vectorizer's state in bytes.
+        """
+        sketch = self.document_frequencies
+        return sys.getsizeof(self) + sys.getsizeof(self.__dict__) + (sys.getsizeof(sketch) if sketch else 0)
+
+    def bucket(self, token):
+        """
+        Hash a (normalized) token.
+
+        :return: (bucket, sign)
+        """
+        h = _token_hash(token)
+        sign = -1 if self.signed and h >> 63 else 1
+        return h % self.n_buckets, sign
+
+    def transform(self, tokens):
+        """
+        Turn a token list into a list of bucket ids usable wherever tokens are.
+
+        Each bucket appears as many times as its (absolute, signed) count, so the
+        result can be fed to InvertedIndex.update_index and the ranking functions
+        unchanged. Token order is not preserved.
+
+        :param tokens: Vectorized document or query
+        :return: List of int bucket ids, sorted
+        """
+        counts = Counter()
+        for token in tokens:
+            token = self.normalize(token)
+            if self.rare_policy != 'keep' and self.is_rare(token):
+                if self.rare_policy == 'drop':
+                    continue
+                counts[self.rare_bucket] += 1
+                continue
+            bucket, sign = self.bucket(token)
+            counts[bucket] += sign
+
+        hashed = []
+        for bucket in sorted(counts):
+            hashed.extend([bucket] * abs(counts[bucket]))
+        return hashed
+
+
+class HashedIndex:
+    """
+    An inverted index over hashed features with the matching query path.
+    """
+
+    def __init__(self, vectorizer, documents=None):
+        """
+        :param vectorizer: A HashingVectorizer; fitted on `documents` here
+        :param documents: Maps links to token lists, dataset.documents by default
+        """
+        documents = dataset.documents if documents is None else documents
+        self.vectorizer = vectorizer.fit(documents.values())
+        self.documents = {link: vectorizer.transform(tokens) for link, tokens in documents.items()}
+        self.index = InvertedIndex()
+        for link, buckets in self.documents.items():
+            self.index.update_index(link, buckets)
+        self.document_norms = ranking.compute_document_norms(self.documents, self.index, self.documents)
+
+    def search(self, query, top_k=10, candidates=None):
+        """
+        Rank documents for a vectorized query (see `ranking.search`).
+        """
+        return ranking.search(self.vectorizer.transform(query), self.document_norms, top_k, candidates, index=self.index)
+
+
+def index_size(index):
+    """
+    Size of an inverted index: number of terms, number of postings and
+    approximate memory of the term dictionary and posting dictionaries in bytes.
+    """
+    postings = sum(len(info['documents']) for info in index.inverted_index.values())
+    memory = sys.getsizeof(index.inverted_index)
+    for term, info in index.inverted_index.items():
+        memory += sys.getsizeof(term) + sys.getsizeof(info) + sys.getsizeof(info['documents'])
+    return {'terms': len(index.inverted_index), 'postings': postings, 'bytes': memory}
+
+
+def collision_report(vectorizer, vocabulary):
+    """
+    Measure how often distinct tokens of a vocabulary share a bucket.
+
+    Args:
+    vectorizer (HashingVectorizer): The vectorizer under test.
+    vocabulary (iterable of str): Distinct tokens, e.g. the terms of the plain inverted index.
+
+    Returns:
+    dict: Number of tokens and occupied buckets, and the fraction of tokens that
+          share their bucket with at least one other token.
+    """
+    tokens = {token for token in map(vectorizer.normalize, vocabulary) if not vectorizer.is_rare(token)}
+    occupancy = Counter(vectorizer.bucket(token)[0] for token in tokens)
+    colliding = sum(count for count in occupancy.values() if count > 1)
+    return {
+        'tokens': len(tokens),
+        'buckets': vectorizer.n_buckets,
+        'occupied_buckets': len(occupancy),
+        'collision_rate': colliding / len(tokens) if tokens else 0.0,
+    }
+
+
+def memory_report(hashed_index, plain_index=None):
+    """
+    Compare the size of a hashed index with the plain index of the same corpus.
+
+    Ranking quality against the plain index is measured by utils.evaluation
+    (mode 'hashed').
+
+    Args:
+    hashed_index (HashedIndex): The hashed index under test.
+    plain_index (InvertedIndex): Token index of the same documents, the global one by default.
+
+    Returns:
+    dict: The sizes of both indexes (see `index_size`), the memory of the
+          vectorizer and the bucket collisions of the plain index's vocabulary
+          (see `collision_report`).
+    """
+    if plain_index is None:
+        plain_index = invertedindex.inverted_index
+    return {
+        'plain_index': index_size(plain_index),
+        'hashed_index': index_size(hashed_index.index),
+        'vectorizer_bytes': hashed_index.vectorizer.memory_bytes(),
+        'collisions': collision_report(hashed_index.vectorizer, plain_index.inverted_index),
+    }
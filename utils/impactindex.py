@@ -0,0 +1,155 @@
+import heapq
+import math
+import time
+from array import array
+from collections import Counter
+from utils import invertedindex
+
+
+class ImpactIndex:
+    """
+    Impact-ordered posting lists for early-terminating, approximate search.
+
+    Every posting stores the document part of `ranking.scoring`,
+    (1 + log tf) * idf / normd, quantized to `bits` bits. Posting lists are
+    sorted by decreasing impact, and the first `champion_size` postings of each
+    list form its champion tier. A query visits the postings of all its terms
+    in decreasing order of contribution, so the highest scoring documents are
+    accumulated first and the traversal can stop after a budget of postings or
+    time with little loss in quality.
+    """
+
+    def __init__(self, bits=8, champion_size=64):
+        """
+        :param bits: Number of bits of a quantized impact (at most 16)
+        :param champion_size: Number of postings in the champion tier of every term
+        """
+        if not 1 <= bits <= 16:
+            raise ValueError("bits must be between 1 and 16")
+        self.bits = bits
+        self.levels = (1 << bits) - 1
+        self.champion_size = champion_size
+        self.links = []
+        self.postings = {}  # token -> (impacts, doc ids), by decreasing impact
+        self.scale = 1.0    # impact value of one quantization step
+        self.total_documents = 0
+
+    @classmethod
+    def build(cls, document_norms, index=None, bits=8, champion_size=64):
+        """
+        Build the impact-ordered postings of an inverted index.
+
+        :param document_norms: Document norms, as used by ranking.search
+        :param index: InvertedIndex to read postings from, the global one by default
+        :param bits: Number of bits of a quantized impact
+        :param champion_size: Number of postings in the champion tier of every term
+        :return: The ImpactIndex
+        """
+        if index is None:
+            index = invertedindex.inverted_index
+
+        impact_index = cls(bits, champion_size)
+        impact_index.total_documents = N = index.get_total_documents()
+        doc_ids = {}
+
+        raw_postings = {}
+        max_impact = 0.0
+        for token in index.inverted_index:
+            df = index.get_document_frequency(token)
+            idf = math.log(N / df) if df else 0
+            postings = []
+            for link, tf in index.get_documents(token).items():
+                normd = document_norms.get(link, 0)
+                impact = (1 + math.log(tf)) * idf / normd if normd else 0
+                if link not in doc_ids:
+                    doc_ids[link] = len(impact_index.links)
+                    impact_index.links.append(link)
+                postings.append((impact, doc_ids[link]))
+                max_impact = max(max_impact, impact)
+            raw_postings[token] = postings
+
+        impact_index.scale = max_impact / impact_index.levels if max_impact else 1.0
+        typecode = 'B' if bits <= 8 else 'H'
+        for token, postings in raw_postings.items():
+            postings.sort(key=lambda posting: -posting[0])
+            impacts = array(typecode, (impact_index.quantize(impact) for impact, _ in postings))
+            impact_index.postings[token] = (impacts, array('I', (doc_id for _, doc_id in postings)))
+
+        return impact_index
+
+    def quantize(self, impact):
+        """
+        Map an impact to its quantization level. Non-zero impacts never round to 0.
+        """
+        if impact <= 0:
+            return 0
+        return max(1, min(self.levels, round(impact / self.scale)))
+
+    def search(self, query, top_k=10, max_postings=None, time_budget_ms=None, tiers=None):
+        """
+        Rank documents for a query by traversing postings in impact order.
+
+        Each posting contributes qpart + impact, where qpart is the query part of
+        `ranking.scoring` for its term, times the number of occurrences of the
+        term in the query, as in `scoring`. With no budget the result
+        matches `ranking.search` up to impact quantization.
+
+        :param query: Vectorized query
+        :param top_k: Number of results to return
+        :param max_postings: Stop after this many postings (the recall/speed knob)
+        :param time_budget_ms: Stop once this much time has been spent traversing
+        :param tiers: 1 to visit only the champion tier of every term, None for all postings
+        :return: List of (link, score) pairs, best first, and the number of postings visited
+        """
+        N = self.total_documents
+        query_counts = Counter(query)
+        df = {term: len(self.postings[term][0]) for term in query_counts if term in self.postings}
+        # Query part of scoring(): the same tfidf vector rough_query_to_non_normalized_tfidf builds
+        normq = math.sqrt(sum(
+            ((1 + math.log(query_counts[term])) * math.log(N / df[term])) ** 2 if term in df else 0
+            for term in query
+        ))
+
+        cursors = []  # one heap entry per term: (-next contribution, term, position)
+        term_state = {}
+        for term, count in query_counts.items():
+            if term not in df:
+                continue
+            idf = math.log(N / df[term])
+            query_part = (1 + math.log(count)) * idf / normq if normq else 0
+            impacts, doc_ids = self.postings[term]
+            end = min(len(impacts), self.champion_size) if tiers == 1 else len(impacts)
+            term_state[term] = (count, query_part, impacts, doc_ids, end)
+            if end:
+                cursors.append((-count * (query_part + impacts[0] * self.scale), term, 0))
+        heapq.heapify(cursors)
+
+        deadline = time.perf_counter() + time_budget_ms / 1000 if time_budget_ms is not None else None
+        accumulators = {}
+        visited = 0
+
+        while cursors:
+            if max_postings is not None and visited >= max_postings:
+                break
+            # Checking the clock is comparatively expensive, so only do it every 256 postings
+            if deadline is not None and not visited & 0xFF and time.perf_counter() > deadline:
+                break
+
+            negative_contribution, term, position = heapq.heappop(cursors)
+            count, query_part, impacts, doc_ids, end = term_state[term]
+            doc_id = doc_ids[position]
+            accumulators[doc_id] = accumulators.get(doc_id, 0) - negative_contribution
+            visited += 1
+
+            position += 1
+            if position < end:
+                heapq.heappush(cursors, (-count * (query_part + impacts[position] * self.scale), term, position))
+
+        results = heapq.nlargest(top_k, accumulators.items(), key=lambda item: item[1])
+        return [(self.links[doc_id], score) for doc_id, score in results], visited
+
+    def total_postings(self):
+        """
+        Total number of postings stored, for sizing the max_postings budget.
+        """
+        return sum(len(impacts) for impacts, _ in self.postings.values())
@@ -4,6 +4,7 @@ class InvertedIndex:
     def __init__(self):
         self.inverted_index = {}
         self.document_lengths = {}  # Store the length of each document for normalization
+        self.stop_tokens = set()  # Near-zero idf tokens, see compute_stop_tokens
 
     def update_index(self, link, tokens):
         """
@@ -78,6 +79,23 @@ class InvertedIndex:
         else:
             return 0
 
+    def compute_stop_tokens(self, max_document_ratio=0.5, min_documents=2):
+        """
+        Derive the stop-token list of the corpus from document frequencies.
+
+        Tokens occurring in at least `max_document_ratio` of the documents (for
+        example '=', 'self' and '.') have an idf close to zero: they barely
+        change rankings but have the longest posting lists.
+
+        :param max_document_ratio: Fraction of the documents from which a token is a stop token
+        :param min_documents: Never mark tokens occurring in fewer documents than this
+        :return: The stop tokens, sorted
+        """
+        threshold = max(min_documents, max_document_ratio * self.get_total_documents())
+        self.stop_tokens = {token for token, info in self.inverted_index.items()
+                            if info['document_frequency'] >= threshold}
+        return sorted(self.stop_tokens)
+
     def get_total_documents(self):
             """
             Get the total number of documents in the inverted index.
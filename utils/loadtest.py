@@ -0,0 +1,275 @@
+"""
+Load generator and latency-percentile benchmark for concurrent search traffic.
+
+Queries (recorded in a file or synthesized from the indexed documents) are
+replayed by N concurrent clients, either open-loop at a target arrival rate or
+closed-loop as fast as the clients can go, against an in-process search mode
+or a local HTTP wrapper. The report covers throughput, service latency,
+queueing delay (time between a request's scheduled arrival and a client
+picking it up), end-to-end latency and garbage-collector pauses.
+
+Usage (from the repository root):
+
+    python -m utils.loadtest --clients 8 --rate 200 --duration 30
+    python -m utils.loadtest --mode impact --queries-file judgments.json --clients 4
+    python -m utils.loadtest --url http://localhost:8000/search --rate 50
+"""
+import argparse
+import gc
+import json
+import queue
+import random
+import statistics
+import tempfile
+import threading
+import time
+import urllib.request
+from codeparser import parser
+from utils import dataset
+from utils import evaluation
+
+
+class GCMonitor:
+    """
+    Records the duration of every garbage collection while installed.
+    """
+
+    def __init__(self):
+        self.pauses = []  # (generation, milliseconds)
+        self._started = None
+
+    def _callback(self, phase, info):
+        if phase == 'start':
+            self._started = time.perf_counter()
+        elif self._started is not None:
+            self.pauses.append((info['generation'], (time.perf_counter() - self._started) * 1000))
+            self._started = None
+
+    def __enter__(self):
+        gc.callbacks.append(self._callback)
+        return self
+
+    def __exit__(self, *exc_info):
+        gc.callbacks.remove(self._callback)
+
+
+def load_queries(filename):
+    """
+    Read recorded queries: a JSON list of token lists, of source strings, or of
+    judgments with a 'query' member (see utils.evaluation).
+    """
+    with open(filename, 'r') as file:
+        records = json.load(file)
+
+    queries = []
+    for record in records:
+        query = record['query'] if isinstance(record, dict) else record
+        queries.append(parser.vectorize(query) if isinstance(query, str) else query)
+    return queries
+
+
+def http_target(url, timeout=30):
+    """
+    Build a target that POSTs {'query': tokens, 'top_k': k} as JSON to a local search server.
+    """
+    def search(query, top_k):
+        body = json.dumps({'query': query, 'top_k': top_k}).encode('utf-8')
+        request = urllib.request.Request(url, data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.load(response)
+    return search
+
+
+def percentiles(values):
+    """
+    Summarize a list of milliseconds with the percentiles that matter for tail latency.
+    """
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def at(fraction):
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    return {
+        'mean': statistics.fmean(ordered),
+        'p50': at(0.50),
+        'p90': at(0.90),
+        'p99': at(0.99),
+        'p999': at(0.999),
+        'max': ordered[-1],
+    }
+
+
+def run(search, queries, clients=4, rate=None, duration=10.0, max_requests=None, top_k=10, poisson=True, seed=0):
+    """
+    Replay queries against a search function with concurrent clients.
+
+    With a `rate`, arrivals are scheduled open-loop (Poisson or evenly spaced)
+    regardless of how fast requests complete, so an overloaded engine shows up
+    as growing queueing delay instead of silently lowering the offered load.
+    Without a rate every client sends its next request as soon as the previous
+    one returns (closed loop), which measures peak throughput.
+
+    Args:
+    search (callable): Function (query, top_k) answering one request.
+    queries (list of list of str): Queries, replayed round robin.
+    clients (int): Number of concurrent client threads.
+    rate (float): Target arrivals per second, None for closed loop.
+    duration (float): Seconds during which requests are issued.
+    max_requests (int): Stop issuing after this many requests.
+    top_k (int): Results requested per query.
+    poisson (bool): Exponential inter-arrival times instead of a fixed interval.
+    seed (int): Seed of the arrival process.
+
+    Returns:
+    dict: Requests, errors, offered and achieved throughput, percentiles of
+          service time, queueing delay and end-to-end latency in ms, and GC pauses.
+    """
+    if not queries:
+        raise ValueError("No queries to replay")
+
+    rng = random.Random(seed)
+    pending = queue.Queue(maxsize=0 if rate else clients)
+    service, queueing, total = [], [], []
+    errors = []
+    lock = threading.Lock()
+    stop = object()
+
+    def client():
+        while True:
+            item = pending.get()
+            if item is stop:
+                return
+            scheduled, query = item
+            started = time.perf_counter()
+            if scheduled is None:
+                # Closed loop: a request only exists once a client is free to send it
+                scheduled = started
+            try:
+                search(query, top_k)
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+                continue
+            finished = time.perf_counter()
+            with lock:
+                service.append((finished - started) * 1000)
+                queueing.append((started - scheduled) * 1000)
+                total.append((finished - scheduled) * 1000)
+
+    threads = [threading.Thread(target=client, name=f"loadtest-client-{i}", daemon=True) for i in range(clients)]
+
+    with GCMonitor() as gc_monitor:
+        for thread in threads:
+            thread.start()
+
+        begin = time.perf_counter()
+        deadline = begin + duration
+        next_arrival = begin
+        issued = 0
+        while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+            if rate:
+                delay = next_arrival - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                scheduled = next_arrival
+                next_arrival += rng.expovariate(rate) if poisson else 1 / rate
+            else:
+                scheduled = None
+            # In closed loop the bounded queue blocks here until a client is free
+            pending.put((scheduled, queries[issued % len(queries)]))
+            issued += 1
+
+        for _ in threads:
+            pending.put(stop)
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - begin
+
+    pauses = [milliseconds for _, milliseconds in gc_monitor.pauses]
+    return {
+        'requests': issued,
+        'completed': len(service),
+        'errors': len(errors),
+        'clients': clients,
+        'offered_rps': rate if rate else None,
+        'throughput_rps': len(service) / elapsed if elapsed else 0.0,
+        'service_ms': percentiles(service),
+        'queueing_ms': percentiles(queueing),
+        'latency_ms': percentiles(total),
+        'gc': {
+            'collections': len(pauses),
+            'total_ms': sum(pauses),
+            'max_ms': max(pauses, default=0.0),
+            'by_generation': {generation: sum(1 for g, _ in gc_monitor.pauses if g == generation) for generation in range(3)},
+        },
+    }
+
+
+def format_report(report):
+    """
+    Render a report as text.
+    """
+    offered = f"{report['offered_rps']:.1f}" if report['offered_rps'] else "closed loop"
+    lines = [
+        f"requests {report['requests']}  completed {report['completed']}  errors {report['errors']}  "
+        f"clients {report['clients']}",
+        f"offered rps {offered}  achieved rps {report['throughput_rps']:.1f}",
+        f"{'ms':<10} {'mean':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'p99.9':>8} {'max':>8}",
+    ]
+    for name in ('service_ms', 'queueing_ms', 'latency_ms'):
+        row = report[name]
+        if row:
+            lines.append(f"{name[:-3]:<10} {row['mean']:>8.2f} {row['p50']:>8.2f} {row['p90']:>8.2f} "
+                         f"{row['p99']:>8.2f} {row['p999']:>8.2f} {row['max']:>8.2f}")
+    gc_report = report['gc']
+    lines.append(f"gc collections {gc_report['collections']}  total {gc_report['total_ms']:.2f} ms  "
+                 f"max pause {gc_report['max_ms']:.2f} ms  per generation {gc_report['by_generation']}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    argument_parser = argparse.ArgumentParser(description="Replay code queries against Scouty with concurrent clients.")
+    argument_parser.add_argument('--queries-file', help="JSON file of recorded queries; synthesized if omitted")
+    argument_parser.add_argument('--queries', type=int, default=500, help="Number of synthesized queries")
+    argument_parser.add_argument('--length', type=int, default=30, help="Tokens per synthesized query")
+    argument_parser.add_argument('--mode', default='exact', help="In-process search mode, see utils.evaluation")
+    argument_parser.add_argument('--url', help="Send requests to a local HTTP search server instead")
+    argument_parser.add_argument('--clients', type=int, default=4)
+    argument_parser.add_argument('--rate', type=float, help="Target requests per second (default: closed loop)")
+    argument_parser.add_argument('--uniform', action='store_true', help="Evenly spaced instead of Poisson arrivals")
+    argument_parser.add_argument('--duration', type=float, default=10.0, help="Seconds to issue requests for")
+    argument_parser.add_argument('--max-requests', type=int)
+    argument_parser.add_argument('--k', type=int, default=10)
+    argument_parser.add_argument('--seed', type=int, default=0)
+    argument_parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = argument_parser.parse_args(argv)
+
+    needs_dataset = not args.url or not args.queries_file
+    if needs_dataset:
+        print("Initing Dataset...")
+        dataset.init()
+
+    if args.queries_file:
+        queries = load_queries(args.queries_file)
+    else:
+        judgments = evaluation.generate_judgments(args.queries, args.length, ('exact', 'rename', 'reorder'), args.seed)
+        queries = [judgment['query'] for judgment in judgments]
+
+    with tempfile.TemporaryDirectory(prefix='scouty-loadtest-') as workdir:
+        if args.url:
+            search = http_target(args.url)
+        else:
+            modes = evaluation.build_modes([args.mode], workdir=workdir)
+            if args.mode not in modes:
+                argument_parser.error(f"mode {args.mode} is not available")
+            search, _, _ = modes[args.mode]
+
+        report = run(search, queries, args.clients, args.rate, args.duration, args.max_requests, args.k,
+                     poisson=not args.uniform, seed=args.seed)
+    print(json.dumps(report, indent=4) if args.json else format_report(report))
+
+
+if __name__ == '__main__':
+    main()
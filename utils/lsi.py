@@ -0,0 +1,279 @@
+import json
+import math
+import os
+import numpy as np
+from utils import invertedindex
+from utils import dataset
+from utils import ranking
+
+
+def build_document_matrix(document_links, min_df=2):
+    """
+    Build the row-normalized TF-IDF document-term matrix in CSR form.
+
+    Tokens occurring in fewer than `min_df` documents are left out: they cannot
+    relate two documents to each other and would only grow the vocabulary.
+
+    Args:
+    document_links (list of str): Links of indexed documents, one row each.
+    min_df (int): Minimum document frequency of a token to become a column.
+
+    Returns:
+    tuple: (indptr, indices, data, vocabulary) where vocabulary maps tokens to columns.
+    """
+    vocabulary = {}
+    indptr = [0]
+    indices = []
+    data = []
+
+    for link in document_links:
+        weights = ranking.tfidf_weights(dataset.documents[link])
+        row = [(token, weight) for token, weight in weights.items()
+               if invertedindex.inverted_index.get_document_frequency(token) >= min_df]
+        row_norm = math.sqrt(sum(weight * weight for _, weight in row)) or 1
+        for token, weight in row:
+            indices.append(vocabulary.setdefault(token, len(vocabulary)))
+            data.append(weight / row_norm)
+        indptr.append(len(indices))
+
+    return (np.array(indptr, dtype=np.int64), np.array(indices, dtype=np.int64),
+            np.array(data, dtype=np.float64), vocabulary)
+
+
+def _csr_dot(indptr, indices, data, dense, block_bytes=32 * 1024 * 1024):
+    """
+    Multiply a CSR matrix by a dense matrix.
+
+    Rows are processed in blocks holding about `block_bytes` of products
+    (non-zeros x dense columns x 8 bytes), whatever the number of non-zeros per
+    row, and the products of each row are summed with np.add.reduceat. A
+    single row larger than the budget still forms a block of its own.
+    """
+    n_rows = len(indptr) - 1
+    result = np.zeros((n_rows, dense.shape[1]), dtype=np.float64)
+    block_nnz = max(1, block_bytes // (8 * max(1, dense.shape[1])))
+
+    start = 0
+    while start < n_rows:
+        stop = int(np.searchsorted(indptr, indptr[start] + block_nnz, side='right')) - 1
+        stop = min(max(stop, start + 1), n_rows)
+        lo, hi = indptr[start], indptr[stop]
+        if hi > lo:
+            products = data[lo:hi, None] * dense[indices[lo:hi]]
+            # reduceat needs the start of every non-empty row; empty rows stay 0
+            row_starts = indptr[start:stop] - lo
+            non_empty = np.diff(indptr[start:stop + 1]) > 0
+            result[start:stop][non_empty] = np.add.reduceat(products, row_starts[non_empty], axis=0)
+        start = stop
+    return result
+
+
+def _csr_transpose(indptr, indices, data, n_columns):
+    """
+    Convert a CSR matrix to the CSR form of its transpose (its CSC form).
+    """
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    order = np.argsort(indices, kind='stable')
+    transposed_indptr = np.concatenate(([0], np.cumsum(np.bincount(indices, minlength=n_columns))))
+    return transposed_indptr.astype(np.int64), rows[order], data[order]
+
+
+def randomized_svd(indptr, indices, data, n_columns, n_components, n_oversamples=10, n_iter=4, seed=0):
+    """
+    Truncated SVD of a sparse matrix with the randomized range finder of Halko et al.
+
+    Args:
+    indptr, indices, data: The matrix in CSR form.
+    n_columns (int): Number of columns of the matrix.
+    n_components (int): Number of singular triplets to return.
+    n_oversamples (int): Extra random directions sampled for accuracy.
+    n_iter (int): Power iterations, which sharpen the spectrum of slowly decaying matrices.
+    seed (int): Seed of the random projection.
+
+    Returns:
+    tuple: (U, S, Vt) with shapes (rows, k), (k,) and (k, n_columns).
+    """
+    rng = np.random.default_rng(seed)
+    n_random = min(n_components + n_oversamples, n_columns, len(indptr) - 1)
+    # Products with the transpose are row-wise products with its CSR form, built once
+    transposed = _csr_transpose(indptr, indices, data, n_columns)
+
+    Q, _ = np.linalg.qr(_csr_dot(indptr, indices, data, rng.standard_normal((n_columns, n_random))))
+    for _ in range(n_iter):
+        Q, _ = np.linalg.qr(_csr_dot(*transposed, Q))
+        Q, _ = np.linalg.qr(_csr_dot(indptr, indices, data, Q))
+
+    B = _csr_dot(*transposed, Q).T
+    Ub, S, Vt = np.linalg.svd(B, full_matrices=False)
+    return (Q @ Ub)[:, :n_components], S[:n_components], Vt[:n_components]
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def _spherical_kmeans(vectors, n_clusters, n_iter=10, seed=0):
+    """
+    Cluster unit vectors by cosine similarity (Lloyd iterations on the sphere).
+
+    Returns:
+    tuple: (centroids, assignments)
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].astype(np.float64)
+
+    for _ in range(n_iter):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for cluster in range(n_clusters):
+            members = vectors[assignments == cluster]
+            if len(members):
+                centroids[cluster] = members.sum(axis=0)
+        centroids = _normalize_rows(centroids)
+
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+class LatentSemanticIndex:
+    """
+    Dense retrieval over a truncated SVD of the TF-IDF matrix.
+
+    Document vectors live in a float32 memory-mapped matrix and are searched
+    through an inverted file (IVF): documents are clustered, and a query only
+    visits the `nprobe` clusters whose centroids are closest to it. The
+    candidates are then reranked with the exact TF-IDF score of `ranking.search`.
+    """
+
+    VECTORS_FILE = 'vectors.f32'
+    META_FILE = 'meta.json'
+    COMPONENTS_FILE = 'components.npy'
+    CENTROIDS_FILE = 'centroids.npy'
+
+    def __init__(self, links, vocabulary, components, vectors, centroids, lists):
+        self.links = links
+        self.vocabulary = vocabulary
+        self.components = components  # (vocabulary, k): projects TF-IDF vectors into the latent space
+        self.vectors = vectors        # (documents, k): unit length document vectors
+        self.centroids = centroids    # (clusters, k)
+        self.lists = lists            # cluster -> array of document rows
+
+    @classmethod
+    def build(cls, directory, document_links=None, n_components=256, n_clusters=None, min_df=2, seed=0):
+        """
+        Build the index from the loaded dataset and write it to `directory`.
+
+        Args:
+        directory (str): Where to store the index files.
+        document_links (list of str): Documents to index, all of dataset.documents by default.
+        n_components (int): Dimensionality of the latent space.
+        n_clusters (int): Number of IVF clusters, about sqrt(documents) by default.
+        min_df (int): Minimum document frequency of a token to be part of the model.
+        seed (int): Seed for the random projection and the clustering.
+
+        Returns:
+        LatentSemanticIndex: The index, with its vectors memory-mapped from disk.
+        """
+        links = list(document_links if document_links is not None else dataset.documents)
+        indptr, indices, data, vocabulary = build_document_matrix(links, min_df)
+        n_components = max(1, min(n_components, len(links), len(vocabulary)))
+
+        U, S, Vt = randomized_svd(indptr, indices, data, len(vocabulary), n_components, seed=seed)
+        vectors = _normalize_rows(U * S).astype(np.float32)
+
+        n_clusters = n_clusters or max(1, int(math.sqrt(len(links))))
+        centroids, assignments = _spherical_kmeans(vectors, min(n_clusters, len(links)), seed=seed)
+
+        os.makedirs(directory, exist_ok=True)
+        mapped = np.memmap(os.path.join(directory, cls.VECTORS_FILE), dtype=np.float32, mode='w+', shape=vectors.shape)
+        mapped[:] = vectors
+        mapped.flush()
+        del mapped
+
+        np.save(os.path.join(directory, cls.COMPONENTS_FILE), Vt.T.astype(np.float32))
+        np.save(os.path.join(directory, cls.CENTROIDS_FILE), centroids.astype(np.float32))
+        with open(os.path.join(directory, cls.META_FILE), 'w') as file:
+            json.dump({
+                'links': links,
+                'vocabulary': vocabulary,
+                'shape': list(vectors.shape),
+                'assignments': assignments.tolist(),
+            }, file)
+
+        return cls.load(directory)
+
+    @classmethod
+    def load(cls, directory):
+        """
+        Open an index written by `build`. Document vectors are memory-mapped, not read.
+        """
+        with open(os.path.join(directory, cls.META_FILE), 'r') as file:
+            meta = json.load(file)
+
+        vectors = np.memmap(os.path.join(directory, cls.VECTORS_FILE), dtype=np.float32, mode='r',
+                            shape=tuple(meta['shape']))
+        components = np.load(os.path.join(directory, cls.COMPONENTS_FILE))
+        centroids = np.load(os.path.join(directory, cls.CENTROIDS_FILE))
+
+        assignments = np.array(meta['assignments'], dtype=np.int64)
+        lists = [np.flatnonzero(assignments == cluster) for cluster in range(len(centroids))]
+        return cls(meta['links'], meta['vocabulary'], components, vectors, centroids, lists)
+
+    def project_query(self, query):
+        """
+        Fold a vectorized query into the latent space.
+
+        Returns:
+        numpy.ndarray: Unit length query vector, or None if no query token is in the model.
+        """
+        weights = ranking.tfidf_weights(query)
+        columns = [(self.vocabulary[token], weight) for token, weight in weights.items() if token in self.vocabulary]
+        if not columns:
+            return None
+
+        rows, values = zip(*columns)
+        projected = np.asarray(values, dtype=np.float32) @ self.components[list(rows)]
+        length = np.linalg.norm(projected)
+        return projected / length if length else None
+
+    def nearest(self, query, n_candidates=100, nprobe=4):
+        """
+        Approximate nearest neighbours of a query in the latent space.
+
+        Args:
+        query (list of str): Vectorized query.
+        n_candidates (int): Number of neighbours to return.
+        nprobe (int): Number of IVF clusters to scan.
+
+        Returns:
+        list of tuples: (link, cosine) pairs, most similar first.
+        """
+        projected = self.project_query(query)
+        if projected is None:
+            return []
+
+        closest = np.argsort(-(self.centroids @ projected))[:nprobe]
+        rows = np.concatenate([self.lists[cluster] for cluster in closest])
+        if not len(rows):
+            return []
+
+        similarities = self.vectors[rows] @ projected
+        order = np.argsort(-similarities)[:n_candidates]
+        return [(self.links[rows[i]], float(similarities[i])) for i in order]
+
+    def search(self, query, document_norms, top_k=10, n_candidates=100, nprobe=4):
+        """
+        Retrieve candidates with the ANN search and rerank them with exact TF-IDF scores.
+
+        Args:
+        query (list of str): Vectorized query.
+        document_norms (dict): Document norms, as used by `ranking.search`.
+        top_k (int): Number of results to return.
+        n_candidates (int): Number of ANN candidates handed to the reranker.
+        nprobe (int): Number of IVF clusters to scan.
+
+        Returns:
+        list of tuples: (link, score) pairs sorted by decreasing exact score.
+        """
+        candidates = {link for link, _ in self.nearest(query, n_candidates, nprobe)}
+        return ranking.search(query, document_norms, top_k, candidates=candidates)
@@ -0,0 +1,224 @@
+from bisect import bisect_left, bisect_right
+import pandas as pd
+
+# Attributes of repos.csv filtered by exact value, and by range
+CATEGORICAL_ATTRIBUTES = ['repo', 'language', 'username']
+NUMERIC_ATTRIBUTES = ['stars', 'forks', 'issues', 'last_commit']
+
+
+def repo_key(link):
+    """
+    Extract 'user/repo' from a GitHub or raw.githubusercontent.com URL.
+
+    Args:
+    link (str): A repository, file or chunk URL.
+
+    Returns:
+    str: The lowercased 'user/repo', or None if the URL is not a GitHub URL.
+    """
+    parts = link.split('://', 1)[-1].split('/')
+    if len(parts) < 3 or parts[0] not in ('github.com', 'raw.githubusercontent.com'):
+        return None
+    return f"{parts[1]}/{parts[2]}".lower()
+
+
+def load_repository_metadata(file_path="repos.csv"):
+    """
+    Read the per-repository metadata of repos.csv.
+
+    Args:
+    file_path (str): Path of the CSV file.
+
+    Returns:
+    dict: Maps 'user/repo' to a dictionary with the repository name and the
+          CATEGORICAL_ATTRIBUTES and NUMERIC_ATTRIBUTES.
+    """
+    try:
+        df = pd.read_csv(file_path)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return {}
+
+    def value(row, column, convert=None):
+        if column not in row or pd.isna(row[column]):
+            return None
+        return convert(row[column]) if convert else row[column]
+
+    repositories = {}
+    for row in df.to_dict('records'):
+        key = repo_key(str(row['repo_url']))
+        if key is None:
+            continue
+        repositories[key] = {
+            'repo': key,
+            'language': value(row, 'language'),
+            'username': value(row, 'username'),
+            'stars': value(row, 'stars', int),
+            'forks': value(row, 'forks', int),
+            'issues': value(row, 'issues', int),
+            'last_commit': value(row, 'last_commit', str),
+        }
+    return repositories
+
+
+def _bitmap_from_ids(doc_ids):
+    # Set the bits in a byte buffer first; or-ing ints one bit at a time is quadratic
+    doc_ids = list(doc_ids)
+    if not doc_ids:
+        return 0
+    buffer = bytearray(max(doc_ids) // 8 + 1)
+    for doc_id in doc_ids:
+        buffer[doc_id >> 3] |= 1 << (doc_id & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+class MetadataIndex:
+    def __init__(self):
+        self.links = []         # doc id -> link
+        self.doc_ids = {}       # link -> doc id
+        self.ids_by_value = {attribute: {} for attribute in CATEGORICAL_ATTRIBUTES}  # attribute -> value -> doc ids
+        self.bitmaps = {attribute: {} for attribute in CATEGORICAL_ATTRIBUTES}  # attribute -> value -> bitmap, built lazily
+        self.sorted_values = {attribute: ([], []) for attribute in NUMERIC_ATTRIBUTES}  # attribute -> (values, doc ids)
+        self._unsorted = set()
+
+    def add_document(self, link, metadata):
+        """
+        Attach metadata to a document.
+
+        Categorical values add the document to the doc ids of that value, from
+        which the value's bitmap is built on its first query; numeric values are
+        kept as (value, doc id) pairs sorted by value, so a range resolves to a
+        contiguous slice.
+
+        :param link: The link of the document
+        :param metadata: Dictionary of attribute values (missing attributes are skipped)
+        """
+        if link in self.doc_ids:
+            return
+        doc_id = len(self.links)
+        self.links.append(link)
+        self.doc_ids[link] = doc_id
+
+        for attribute in CATEGORICAL_ATTRIBUTES:
+            value = metadata.get(attribute)
+            if value is not None:
+                self.ids_by_value[attribute].setdefault(value, []).append(doc_id)
+                self.bitmaps[attribute].pop(value, None)
+
+        for attribute in NUMERIC_ATTRIBUTES:
+            value = metadata.get(attribute)
+            if value is not None:
+                values, ids = self.sorted_values[attribute]
+                values.append(value)
+                ids.append(doc_id)
+                self._unsorted.add(attribute)
+
+    def _sort(self, attribute):
+        if attribute in self._unsorted:
+            values, ids = self.sorted_values[attribute]
+            pairs = sorted(zip(values, ids))
+            self.sorted_values[attribute] = ([value for value, _ in pairs], [doc_id for _, doc_id in pairs])
+            self._unsorted.discard(attribute)
+        return self.sorted_values[attribute]
+
+    def _bitmap(self, attribute, value):
+        bitmaps = self.bitmaps[attribute]
+        if value not in bitmaps:
+            bitmaps[value] = _bitmap_from_ids(self.ids_by_value[attribute].get(value, ()))
+        return bitmaps[value]
+
+    def equals(self, attribute, values):
+        """
+        Bitmap of the documents whose attribute takes one of the given values.
+
+        :param attribute: One of CATEGORICAL_ATTRIBUTES
+        :param values: A value or a list of accepted values
+        :return: Bitmap as an int, bit i set for doc id i
+        """
+        if isinstance(values, str) or not isinstance(values, (list, tuple, set)):
+            values = [values]
+        bitmap = 0
+        for value in values:
+            if attribute == 'repo':
+                value = value.lower()
+            bitmap |= self._bitmap(attribute, value)
+        return bitmap
+
+    def in_range(self, attribute, minimum=None, maximum=None):
+        """
+        Bitmap of the documents whose attribute lies in [minimum, maximum].
+
+        :param attribute: One of NUMERIC_ATTRIBUTES
+        :param minimum: Lower bound, or None for no bound
+        :param maximum: Upper bound, or None for no bound
+        :return: Bitmap as an int, bit i set for doc id i
+        """
+        values, ids = self._sort(attribute)
+        lo = 0 if minimum is None else bisect_left(values, minimum)
+        hi = len(values) if maximum is None else bisect_right(values, maximum)
+        return _bitmap_from_ids(ids[lo:hi])
+
+    def filter(self, **conditions):
+        """
+        Combine conditions into one bitmap (all conditions must hold).
+
+        Categorical attributes are matched by value (a list means any of them),
+        numeric ones through min_<attribute> and max_<attribute>, e.g.
+        filter(language='Python', min_stars=10000, min_last_commit='2018-12-01').
+
+        :return: Bitmap as an int, bit i set for doc id i
+        """
+        bitmap = (1 << len(self.links)) - 1
+        ranges = {}
+        for name, value in conditions.items():
+            if name in CATEGORICAL_ATTRIBUTES:
+                bitmap &= self.equals(name, value)
+            elif name.startswith(('min_', 'max_')) and name[4:] in NUMERIC_ATTRIBUTES:
+                bounds = ranges.setdefault(name[4:], [None, None])
+                bounds[0 if name.startswith('min_') else 1] = value
+            else:
+                raise ValueError(f"Unknown metadata filter: {name}")
+            if not bitmap:
+                return 0
+
+        for attribute, (minimum, maximum) in ranges.items():
+            bitmap &= self.in_range(attribute, minimum, maximum)
+        return bitmap
+
+    def to_links(self, bitmap):
+        """
+        Convert a bitmap into the set of document links it selects.
+        """
+        bits = bin(bitmap)[:1:-1]  # least significant bit first
+        links = set()
+        doc_id = bits.find('1')
+        while doc_id != -1:
+            links.add(self.links[doc_id])
+            doc_id = bits.find('1', doc_id + 1)
+        return links
+
+    def filter_links(self, **conditions):
+        """
+        Same as `filter`, returning the selected document links.
+        """
+        return self.to_links(self.filter(**conditions))
+
+
+def document_metadata(link, repositories):
+    """
+    Look up the metadata of a document by the repository its link points to.
+
+    Args:
+    link (str): The link of the document.
+    repositories (dict): Output of `load_repository_metadata`.
+
+    Returns:
+    dict: The repository metadata; only 'repo' for repositories missing from repos.csv.
+    """
+    key = repo_key(link)
+    if key is None:
+        return {}
+    return dict(repositories.get(key, {'repo': key}))
+
+
+metadata_index = MetadataIndex()
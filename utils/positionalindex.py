@@ -0,0 +1,231 @@
+import heapq
+import math
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+
+def encode_positions(positions):
+    """
+    Delta-encode an increasing list of positions as LEB128 varints.
+
+    :param positions: Sorted list of non-negative token positions
+    :return: bytes holding the gaps between consecutive positions
+    """
+    encoded = bytearray()
+    previous = 0
+    for position in positions:
+        gap = position - previous
+        previous = position
+        while gap >= 0x80:
+            encoded.append((gap & 0x7F) | 0x80)
+            gap >>= 7
+        encoded.append(gap)
+    return bytes(encoded)
+
+
+def decode_positions(encoded):
+    """
+    Decode the output of encode_positions back into absolute positions.
+
+    :param encoded: bytes produced by encode_positions
+    :return: Sorted list of token positions
+    """
+    positions = []
+    position = 0
+    gap = 0
+    shift = 0
+    for byte in encoded:
+        gap |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        position += gap
+        positions.append(position)
+        gap = 0
+        shift = 0
+    return positions
+
+
+class PositionalIndex:
+    def __init__(self):
+        self.positional_index = {}  # token -> {link: delta-encoded positions}
+        self.document_lengths = {}
+
+    def update_index(self, link, tokens):
+        """
+        Add a document and the positions of each of its tokens to the index.
+
+        :param link: The link of the document
+        :param tokens: The document tokens, in source order
+        """
+        positions = {}
+        for position, token in enumerate(tokens):
+            positions.setdefault(token, []).append(position)
+
+        for token, token_positions in positions.items():
+            self.positional_index.setdefault(token, {})[link] = encode_positions(token_positions)
+
+        self.document_lengths[link] = len(tokens)
+
+    def get_documents(self, token):
+        """
+        Retrieve the encoded postings of a token.
+
+        :param token: The token to query in the index
+        :return: Dictionary mapping document links to encoded positions
+        """
+        return self.positional_index.get(token, {})
+
+    def get_positions(self, link, token):
+        """
+        Retrieve the positions of a token in a document.
+
+        :param link: The link of the document
+        :param token: The token to look up
+        :return: Sorted list of positions (empty if the token does not occur)
+        """
+        encoded = self.positional_index.get(token, {}).get(link)
+        return decode_positions(encoded) if encoded else []
+
+    def get_document_frequency(self, token):
+        """
+        Retrieve the number of documents containing a token.
+        """
+        return len(self.positional_index.get(token, {}))
+
+    def get_total_documents(self):
+        """
+        Get the total number of documents in the index.
+        """
+        return len(self.document_lengths)
+
+    def candidate_documents(self, tokens):
+        """
+        Intersect the posting lists of the given tokens, shortest list first.
+
+        :param tokens: Tokens that must all occur in a document
+        :return: Set of links of documents containing every token
+        """
+        postings = sorted((self.get_documents(token) for token in set(tokens)), key=len)
+        if not postings or not postings[0]:
+            return set()
+
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        return candidates
+
+    def count_sequence(self, link, tokens, slop=0):
+        """
+        Count the occurrences of a token sequence in a document.
+
+        With slop=0 the tokens must be contiguous. With slop=k up to k other tokens
+        may sit between two consecutive tokens of the sequence. Occurrences are
+        counted by their first token, so overlapping matches each count once.
+
+        :param link: The link of the document
+        :param tokens: The token sequence
+        :param slop: Maximum number of tokens allowed between consecutive sequence tokens
+        :return: Number of positions at which the sequence starts
+        """
+        positions = [self.get_positions(link, token) for token in tokens]
+        if not all(positions):
+            return 0
+
+        if slop == 0:
+            starts = set(positions[0])
+            for offset, token_positions in enumerate(positions[1:], start=1):
+                starts.intersection_update(position - offset for position in token_positions)
+                if not starts:
+                    return 0
+            return len(starts)
+
+        matches = 0
+        for start in positions[0]:
+            # Every position the sequence so far can end at; taking only the earliest
+            # one misses matches whose next token is only within reach of a later one
+            reachable = [start]
+            for token_positions in positions[1:]:
+                following = []
+                for i in range(bisect_right(token_positions, reachable[0]), len(token_positions)):
+                    position = token_positions[i]
+                    if position > reachable[-1] + slop + 1:
+                        break
+                    # Is some reachable position p with p < position <= p + slop + 1?
+                    j = bisect_left(reachable, position - slop - 1)
+                    if j < len(reachable) and reachable[j] < position:
+                        following.append(position)
+                if not following:
+                    break
+                reachable = following
+            else:
+                matches += 1
+        return matches
+
+    def _sequence_scores(self, tokens, slop):
+        """
+        Score every document containing a token sequence.
+
+        The sequence is treated as a single term: its weight in a document is
+        (1 + log count) and its idf is log(N / number of documents matching it),
+        mirroring the log-tf x idf weighting used in utils.ranking.
+        """
+        counts = {}
+        for link in self.candidate_documents(tokens):
+            count = self.count_sequence(link, tokens, slop)
+            if count:
+                counts[link] = count
+
+        if not counts:
+            return {}
+
+        N = self.get_total_documents()
+        # Sequences matching every document still get a small weight, so they can break ties
+        idf = max(math.log(N / len(counts)), 1.0 / N)
+        return {link: (1 + math.log(count)) * idf for link, count in counts.items()}
+
+    def phrase_search(self, query, slop=0, top_k=10):
+        """
+        Rank documents by occurrences of the whole query as a token sequence.
+
+        :param query: Vectorized query (list of tokens, in order)
+        :param slop: Maximum number of tokens allowed between consecutive query tokens
+        :param top_k: Number of results to return
+        :return: List of (link, score) pairs, best first
+        """
+        if not query:
+            return []
+        scores = self._sequence_scores(query, slop)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def ngram_search(self, query, n=3, slop=0, top_k=10):
+        """
+        Rank documents by the order-sensitive token n-grams of the query they contain.
+
+        Each distinct n-gram of the query is matched through posting-list
+        intersection and scored like a term; a document's score is the sum over
+        n-grams weighted by how often the n-gram occurs in the query. This keeps
+        the ranking robust to small edits that break a full phrase match.
+
+        :param query: Vectorized query (list of tokens, in order)
+        :param n: Length of the n-grams
+        :param slop: Maximum number of tokens allowed between consecutive n-gram tokens
+        :param top_k: Number of results to return
+        :return: List of (link, score) pairs, best first
+        """
+        if len(query) <= n:
+            return self.phrase_search(query, slop, top_k)
+
+        ngrams = Counter(tuple(query[i:i + n]) for i in range(len(query) - n + 1))
+        scores = {}
+        for ngram, query_count in ngrams.items():
+            weight = 1 + math.log(query_count)
+            for link, score in self._sequence_scores(ngram, slop).items():
+                scores[link] = scores.get(link, 0) + weight * score
+
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+
+positional_index = PositionalIndex()
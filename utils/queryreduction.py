@@ -0,0 +1,59 @@
+import math
+from collections import Counter
+from utils import invertedindex
+
+
+def reduce_query(query, index=None, drop_stop_tokens=True, min_idf=0.0, max_repeats=None, max_terms=None):
+    """
+    Drop or cap query terms that cost posting-list traversals but barely affect the ranking.
+
+    Args:
+    query (list of str): Vectorized query.
+    index (InvertedIndex): Index to read statistics from, the global one by default.
+    drop_stop_tokens (bool): Remove the tokens in `index.stop_tokens`.
+    min_idf (float): Remove tokens whose idf is below this value. Tokens that do
+                     not occur in the corpus are always removed: they match nothing.
+    max_repeats (int): Keep at most this many occurrences of a token. `scoring`
+                       adds a term once per occurrence, so long queries with
+                       repeated tokens do the same work many times.
+    max_terms (int): Keep only the occurrences of the `max_terms` distinct tokens
+                     with the highest idf.
+
+    Returns:
+    list of str: The reduced query, in the original token order.
+    """
+    if index is None:
+        index = invertedindex.inverted_index
+    N = index.get_total_documents()
+
+    idf = {}
+    for term in set(query):
+        df = index.get_document_frequency(term)
+        if df == 0 or (drop_stop_tokens and term in index.stop_tokens):
+            continue
+        term_idf = math.log(N / df)
+        if term_idf >= min_idf:
+            idf[term] = term_idf
+
+    if max_terms is not None and len(idf) > max_terms:
+        kept = sorted(idf, key=lambda term: (-idf[term], term))[:max_terms]
+        idf = {term: idf[term] for term in kept}
+
+    reduced = []
+    seen = Counter()
+    for term in query:
+        if term not in idf:
+            continue
+        seen[term] += 1
+        if max_repeats is None or seen[term] <= max_repeats:
+            reduced.append(term)
+    return reduced
+
+
+def postings_cost(query, index=None):
+    """
+    Number of postings a term-at-a-time search walks for a query.
+    """
+    if index is None:
+        index = invertedindex.inverted_index
+    return sum(index.get_document_frequency(term) for term in query)
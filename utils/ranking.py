@@ -1,4 +1,5 @@
 import ast
+import heapq
 import numpy as np
 import math
 from collections import Counter, OrderedDict
@@ -80,7 +81,7 @@ def get_tokens_from_vectorized_document(vectorized_doc):
         return []
 
 
-def transform_to_non_normalized_tfidf(document_link):
+def transform_to_non_normalized_tfidf(document_link, index=None, documents=None):
     """
     Transform a document into its non-normalized TF-IDF vector representation.
 
@@ -89,6 +90,8 @@ def transform_to_non_normalized_tfidf(document_link):
 
     Parameters:
     document_link (str): A link to the document for which the TF-IDF vector is to be computed.
+    index (InvertedIndex): Index to read statistics from; defaults to the global `invertedindex.inverted_index`.
+    documents (dict): Maps links to document tokens; defaults to the global `dataset.documents`.
 
     Returns:
     list: A list of TF-IDF scores, one for each term in the document.
@@ -108,13 +111,17 @@ def transform_to_non_normalized_tfidf(document_link):
     `invertedindex.inverted_index.get_document_frequency`, and `invertedindex.inverted_index.get_total_documents`
     are defined and accessible.
     """
+    if index is None:
+        index = invertedindex.inverted_index
+    if documents is None:
+        documents = dataset.documents
     
     tdfidf_vector = []
 
-    for token in dataset.documents[document_link]:
-        tf = invertedindex.inverted_index.get_term_frequency(document_link, token)
-        df = invertedindex.inverted_index.get_document_frequency(token)
-        N = invertedindex.inverted_index.get_total_documents()
+    for token in documents[document_link]:
+        tf = index.get_term_frequency(document_link, token)
+        df = index.get_document_frequency(token)
+        N = index.get_total_documents()
        
         if ((tf == 0) or (df ==0) or ((N/df) == 0)):
             tdfidf_vector.append(0)
@@ -166,7 +173,7 @@ def transform_to_normalized_tfidf(document_link):
     return tfidf_vector
                 
 
-def rough_query_to_non_normalized_tfidf(query):
+def rough_query_to_non_normalized_tfidf(query, index=None):
     """
     Compute the non-normalized TF-IDF vector for a given query.
 
@@ -176,6 +183,7 @@ def rough_query_to_non_normalized_tfidf(query):
 
     Parameters:
     query: vectorized document.
+    index (InvertedIndex): Index to read statistics from; defaults to the global `invertedindex.inverted_index`.
 
     Returns:
     list: A list of TF-IDF scores, one for each term in the query.
@@ -186,14 +194,17 @@ def rough_query_to_non_normalized_tfidf(query):
     - Inverse Document Frequency (IDF): A measure of how much information the term provides.
     
     The function returns a list of TF-IDF scores for the terms in the query.
-    Note: The function relies on `query_term_frequency` and methods from `invertedindex.inverted_index`.
+    Note: The function relies on methods from `invertedindex.inverted_index`.
     """
+    if index is None:
+        index = invertedindex.inverted_index
+    query_counts = Counter(query)
     tdfidf_vector = []
 
     for term in query:
-        tf = query_term_frequency(query, term)
-        df = invertedindex.inverted_index.get_document_frequency(term)
-        N = invertedindex.inverted_index.get_total_documents()
+        tf = query_counts[term]
+        df = index.get_document_frequency(term)
+        N = index.get_total_documents()
 
         if ((tf == 0) or (df == 0) or ((N/df) == 0)):
             tdfidf_vector.append(0)
@@ -205,7 +216,7 @@ def rough_query_to_non_normalized_tfidf(query):
     
     return tdfidf_vector
 
-def scoring(query, normq, normd, document_link):
+def scoring(query, normq, normd, document_link, index=None):
     """
     Calculate the relevance score of a document with respect to a query.
 
@@ -218,6 +229,7 @@ def scoring(query, normq, normd, document_link):
     normq (float): The norm of the query's TF-IDF vector.
     normalized_document (float): The norm of the document's TF-IDF vector.
     document_link (str): A link to the document being scored.
+    index (InvertedIndex): Index to read statistics from; defaults to the global `invertedindex.inverted_index`.
 
     Returns:
     float: A score representing the relevance of the document to the query.
@@ -226,15 +238,18 @@ def scoring(query, normq, normd, document_link):
     multiplies it with the term's IDF, and normalizes the score by the corresponding vector norms.
     It sums up these values to get the final relevance score.
 
-    Note: The function relies on `query_term_frequency` and methods from `invertedindex.inverted_index`.
+    Note: The function relies on methods from `invertedindex.inverted_index`.
     """
-    N = invertedindex.inverted_index.get_total_documents()
+    if index is None:
+        index = invertedindex.inverted_index
+    N = index.get_total_documents()
+    query_counts = Counter(query)  # counted once, not once per term
     result = 0
 
     for term in query:
-        tfq = query_term_frequency(query, term)
-        tfd = invertedindex.inverted_index.get_term_frequency(document_link, term)
-        df = invertedindex.inverted_index.get_document_frequency(term)
+        tfq = query_counts[term]
+        tfd = index.get_term_frequency(document_link, term)
+        df = index.get_document_frequency(term)
 
         if df != 0 and tfd != 0 and tfq != 0:
             weighted_tfd = 1 + np.log(tfd)
@@ -252,3 +267,100 @@ def scoring(query, normq, normd, document_link):
 
     return result
 
+
+
+def tfidf_weights(tokens, index=None):
+    """
+    Compute the log-tf x idf weight of every distinct token of a vectorized document.
+
+    Unlike `transform_to_non_normalized_tfidf`, which returns one score per token
+    occurrence, this returns one weight per distinct token, which is what sparse
+    vector operations (dot products, matrix builds) need.
+
+    Parameters:
+    tokens (list of str): vectorized document or query.
+    index (InvertedIndex): Index to read statistics from; defaults to the global `invertedindex.inverted_index`.
+
+    Returns:
+    dict: Maps each token with a non-zero weight to (1 + log tf) * log(N / df).
+    """
+    if index is None:
+        index = invertedindex.inverted_index
+    N = index.get_total_documents()
+    weights = {}
+
+    for term, tf in Counter(tokens).items():
+        df = index.get_document_frequency(term)
+        if df == 0 or df == N:
+            continue
+        weights[term] = (1 + math.log(tf)) * math.log(N / df)
+
+    return weights
+
+
+def compute_document_norms(document_links, index=None, documents=None):
+    """
+    Compute the norm of the non-normalized TF-IDF vector of each document.
+
+    Parameters:
+    document_links (iterable of str): links of indexed documents.
+    index (InvertedIndex): Index to read statistics from; defaults to the global `invertedindex.inverted_index`.
+    documents (dict): Maps links to document tokens; defaults to the global `dataset.documents`.
+
+    Returns:
+    dict: Maps each link to the `normd` value expected by `scoring` and `search`.
+    """
+    return {link: norm(transform_to_non_normalized_tfidf(link, index, documents)) for link in document_links}
+
+
+def search(query, document_norms, top_k=10, candidates=None, index=None):
+    """
+    Rank documents for a query using the same formula as `scoring`.
+
+    Instead of calling `scoring` for every document, scores are accumulated term
+    by term over the posting lists of the query terms, so only documents sharing
+    at least one term with the query are touched. Documents sharing no term
+    would score 0 in `scoring` and are not returned.
+
+    Parameters:
+    query (list of str): vectorized document.
+    document_norms (dict): Maps document links to their TF-IDF vector norms
+                           (see `compute_document_norms`).
+    top_k (int): Number of results to return.
+    candidates (set of str): If given, only these documents are scored. When the set is
+                             smaller than a posting list, only its documents are looked up.
+    index (InvertedIndex): Index to read statistics from; defaults to the global `invertedindex.inverted_index`.
+
+    Returns:
+    list of tuples: (link, score) pairs sorted by decreasing score.
+    """
+    if index is None:
+        index = invertedindex.inverted_index
+    N = index.get_total_documents()
+    normq = norm(rough_query_to_non_normalized_tfidf(query, index))
+    query_counts = Counter(query)
+    accumulators = {}
+
+    # Iterate over every occurrence, as `scoring` does, so repeated terms count repeatedly
+    for term in query:
+        df = index.get_document_frequency(term)
+        if df == 0:
+            continue
+        idf = math.log(N / df)
+        query_part = (1 + math.log(query_counts[term])) * idf / normq if normq else 0
+
+        postings = index.get_documents(term)
+        if candidates is None:
+            matches = postings.items()
+        elif len(candidates) < len(postings):
+            # Pre-filter: probe the posting list for each candidate instead of walking it
+            matches = ((link, postings[link]) for link in candidates if link in postings)
+        else:
+            matches = ((link, tfd) for link, tfd in postings.items() if link in candidates)
+
+        for link, tfd in matches:
+            normd = document_norms.get(link, 0)
+            document_part = (1 + math.log(tfd)) * idf / normd if normd else 0
+            accumulators[link] = accumulators.get(link, 0) + query_part + document_part
+
+    return heapq.nlargest(top_k, accumulators.items(), key=lambda item: item[1])
@@ -0,0 +1,164 @@
+import math
+import multiprocessing
+import os
+from utils import invertedindex
+from utils import dataset
+from utils import ranking
+from utils import chunking
+
+# Read-only join state, installed once per worker process by _init_worker
+_state = {}
+
+
+def build_vectors(document_links):
+    """
+    Build unit length TF-IDF vectors with features in a global rare-first order.
+
+    Features are numbered by increasing document frequency (decreasing idf), so
+    the beginning of every vector holds its rarest tokens, which have the
+    shortest posting lists.
+
+    Args:
+    document_links (list of str): Links of the documents to join.
+
+    Returns:
+    list of tuples: One (feature_ids, weights) pair per document, both sorted by feature id.
+    """
+    weights_per_document = [ranking.tfidf_weights(dataset.documents[link]) for link in document_links]
+
+    tokens = {token for weights in weights_per_document for token in weights}
+    order = sorted(tokens, key=lambda token: (invertedindex.inverted_index.get_document_frequency(token), token))
+    feature_ids = {token: i for i, token in enumerate(order)}
+
+    vectors = []
+    for weights in weights_per_document:
+        length = math.sqrt(sum(weight * weight for weight in weights.values())) or 1
+        features = sorted((feature_ids[token], weight / length) for token, weight in weights.items())
+        vectors.append((tuple(f for f, _ in features), tuple(w for _, w in features)))
+    return vectors
+
+
+def build_prefix_index(vectors, threshold):
+    """
+    Index the prefix of every vector that any pair above the threshold must share.
+
+    A feature is indexed while the norm of the vector from that feature onward is
+    at least `threshold`. The unindexed suffix then has a norm below the
+    threshold, and by Cauchy-Schwarz a vector overlapping only that suffix
+    cannot reach a cosine of `threshold`. Because features are ordered rare
+    first, the frequent tokens with huge posting lists are the ones left out.
+
+    Returns:
+    dict: feature id -> list of (row, weight)
+    """
+    index = {}
+    squared_threshold = threshold * threshold
+    for row, (features, weights) in enumerate(vectors):
+        remaining = sum(weight * weight for weight in weights)
+        for feature, weight in zip(features, weights):
+            if remaining < squared_threshold:
+                break
+            index.setdefault(feature, []).append((row, weight))
+            remaining -= weight * weight
+    return index
+
+
+def _init_worker(vectors, index, threshold, groups):
+    _state['vectors'] = vectors
+    _state['index'] = index
+    _state['threshold'] = threshold
+    _state['groups'] = groups
+    _state['max_weights'] = [max(weights, default=0) for _, weights in vectors]
+    _state['l1_norms'] = [sum(weights) for _, weights in vectors]
+
+
+def _join_rows(rows):
+    """
+    Find the pairs (row, other) with other < row and cosine >= threshold.
+    """
+    vectors = _state['vectors']
+    index = _state['index']
+    threshold = _state['threshold']
+    groups = _state['groups']
+    max_weights = _state['max_weights']
+    l1_norms = _state['l1_norms']
+
+    pairs = []
+    for row in range(*rows):
+        features, weights = vectors[row]
+        candidates = set()
+        for feature in features:
+            for other, _ in index.get(feature, ()):
+                if other < row:
+                    candidates.add(other)
+
+        if not candidates:
+            continue
+
+        x = dict(zip(features, weights))
+        for other in candidates:
+            if groups is not None and groups[other] == groups[row]:
+                continue
+            # Length filter: cos(x, y) <= max(x) * |y|_1 and max(y) * |x|_1
+            if min(max_weights[row] * l1_norms[other], max_weights[other] * l1_norms[row]) < threshold:
+                continue
+            other_features, other_weights = vectors[other]
+            similarity = sum(weight * x.get(feature, 0) for feature, weight in zip(other_features, other_weights))
+            if similarity >= threshold:
+                pairs.append((other, row, similarity))
+    return pairs
+
+
+def all_pairs(threshold=0.9, output="similar_pairs.tsv", document_links=None, processes=None,
+              block_size=512, skip_same_file=True):
+    """
+    Find every pair of documents whose TF-IDF cosine similarity is at least `threshold`.
+
+    This is an All-Pairs style similarity join: candidates are generated from a
+    prefix-filtered inverted index (see `build_prefix_index`), pruned with a
+    length filter and verified exactly. Blocks of documents are joined in
+    parallel worker processes and every finished block is appended to `output`
+    straight away, one 'link_a<TAB>link_b<TAB>similarity' line per pair.
+
+    Args:
+    threshold (float): Minimum cosine similarity, in (0, 1].
+    output (str): Path of the tab separated edge list to write.
+    document_links (list of str): Documents to join, all of dataset.documents by default.
+    processes (int): Number of worker processes, os.cpu_count() by default; 1 joins in-process.
+    block_size (int): Number of documents handed to a worker at a time.
+    skip_same_file (bool): Ignore pairs of chunks cut from the same file.
+
+    Returns:
+    int: Number of pairs written.
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError("threshold must be in (0, 1]")
+
+    links = list(document_links if document_links is not None else dataset.documents)
+    vectors = build_vectors(links)
+    index = build_prefix_index(vectors, threshold)
+    groups = [chunking.parent_link(link) for link in links] if skip_same_file else None
+
+    blocks = [(start, min(start + block_size, len(links))) for start in range(0, len(links), block_size)]
+    processes = processes or os.cpu_count() or 1
+    initargs = (vectors, index, threshold, groups)
+
+    written = 0
+    with open(output, 'w') as file:
+        def write(pairs):
+            nonlocal written
+            for a, b, similarity in pairs:
+                file.write(f"{links[a]}\t{links[b]}\t{similarity:.6f}\n")
+            written += len(pairs)
+            file.flush()
+
+        if processes == 1 or len(blocks) == 1:
+            _init_worker(*initargs)
+            for block in blocks:
+                write(_join_rows(block))
+        else:
+            with multiprocessing.Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+                for pairs in pool.imap_unordered(_join_rows, blocks):
+                    write(pairs)
+
+    return written
@@ -0,0 +1,324 @@
+import copy
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from utils import dataset
+from utils import ranking
+from utils.impactindex import ImpactIndex
+from utils.invertedindex import InvertedIndex
+from utils.metadata import MetadataIndex
+from utils.positionalindex import PositionalIndex
+
+CURRENT_FILE = "CURRENT"
+DOCUMENTS_FILE = "documents.json"
+
+
+def write_snapshot(documents=None, parents=None, metadata=None, root="snapshots"):
+    """
+    Write an immutable, versioned snapshot of a corpus and make it the current one.
+
+    The snapshot is written to a temporary directory and renamed into place, and
+    the CURRENT pointer is replaced atomically afterwards, so a reader never
+    sees a half written snapshot.
+
+    Args:
+    documents (dict): Maps links to token lists, dataset.documents by default.
+    parents (dict): Maps chunk links to file links, dataset.parents by default.
+    metadata (dict): Maps links to repository metadata, dataset.metadata by default.
+    root (str): Directory holding all snapshot versions.
+
+    Returns:
+    str: The version of the new snapshot.
+    """
+    documents = dataset.documents if documents is None else documents
+    parents = dataset.parents if parents is None else parents
+    metadata = dataset.metadata if metadata is None else metadata
+
+    os.makedirs(root, exist_ok=True)
+    # Versions sort chronologically as plain strings
+    now = time.time_ns()
+    version = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now // 1_000_000_000)) + f"-{now % 1_000_000_000:09d}"
+
+    tmp_directory = os.path.join(root, f".tmp-{version}")
+    os.makedirs(tmp_directory)
+    with open(os.path.join(tmp_directory, DOCUMENTS_FILE), 'w') as file:
+        json.dump({'documents': documents, 'parents': parents, 'metadata': metadata}, file)
+    os.rename(tmp_directory, os.path.join(root, version))
+
+    tmp_current = os.path.join(root, CURRENT_FILE + ".tmp")
+    with open(tmp_current, 'w') as file:
+        file.write(version)
+    os.replace(tmp_current, os.path.join(root, CURRENT_FILE))
+
+    return version
+
+
+def publish_dataset(filename="dataset.json", root="snapshots"):
+    """
+    Make a snapshot of a dataset.json style file current, unless the current
+    snapshot is already newer than the file. The file is read without building
+    any index.
+
+    Args:
+    filename (str): The dataset file.
+    root (str): Directory holding all snapshot versions.
+
+    Returns:
+    str: The current version afterwards (None if there is neither a snapshot nor a dataset).
+    """
+    version = current_version(root)
+    if not os.path.exists(filename):
+        return version
+    if version is not None:
+        snapshot_file = os.path.join(root, version, DOCUMENTS_FILE)
+        if os.path.exists(snapshot_file) and os.path.getmtime(snapshot_file) >= os.path.getmtime(filename):
+            return version
+
+    documents, parents, metadata = dataset.load_documents(filename)
+    return write_snapshot(documents, parents, metadata, root)
+
+
+def current_version(root="snapshots"):
+    """
+    Return the version the CURRENT pointer of `root` refers to, or None if there is none.
+    """
+    try:
+        with open(os.path.join(root, CURRENT_FILE), 'r') as file:
+            return file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def list_versions(root="snapshots"):
+    """
+    Return the versions stored under `root`, oldest first.
+    """
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root)
+                  if not name.startswith('.') and os.path.isdir(os.path.join(root, name)))
+
+
+class Snapshot:
+    """
+    A loaded, read-only version of the corpus with its own inverted index.
+
+    Nothing in a snapshot is modified after loading, so any number of searches
+    can use it concurrently while a newer snapshot is being built.
+    """
+
+    def __init__(self, version, documents, parents, metadata=None, positional=False, impact=False, hashing=None):
+        """
+        :param positional: Also build a positional index, needed for phrase and n-gram queries
+        :param impact: Also build impact-ordered postings, needed for budgeted searches
+        :param hashing: A utils.hashing.HashingVectorizer; index its bucket ids instead of
+                        tokens, so the number of index terms is bounded (a fitted copy is kept)
+        """
+        self.version = version
+        self.documents = documents
+        self.parents = parents
+        self.metadata = metadata or {}
+        self.vectorizer = None
+        indexed = documents
+        if hashing is not None:
+            # A copy, so snapshots loaded with the same options never share fitted state
+            self.vectorizer = copy.copy(hashing).fit(documents.values())
+            indexed = {link: self.vectorizer.transform(tokens) for link, tokens in documents.items()}
+
+        self.index = InvertedIndex()
+        self.metadata_index = MetadataIndex()
+        for link, tokens in indexed.items():
+            self.index.update_index(link, tokens)
+            self.metadata_index.add_document(link, self.metadata.get(link, {}))
+        self.index.compute_stop_tokens()
+        self.document_norms = ranking.compute_document_norms(indexed, self.index, indexed)
+
+        self.positional_index = None
+        if positional:
+            self.positional_index = PositionalIndex()
+            for link, tokens in documents.items():
+                self.positional_index.update_index(link, tokens)
+
+        self.impact_index = ImpactIndex.build(self.document_norms, self.index) if impact else None
+
+    @classmethod
+    def load(cls, version, root="snapshots", **options):
+        """
+        Load the snapshot `version` from `root` and build its index.
+
+        :param options: Optional indexes to build, see `Snapshot.__init__`
+        """
+        with open(os.path.join(root, version, DOCUMENTS_FILE), 'r') as file:
+            data = json.load(file)
+        return cls(version, data['documents'], data.get('parents', {}), data.get('metadata', {}), **options)
+
+    def search(self, query, top_k=10, candidates=None, filters=None, max_postings=None, time_budget_ms=None):
+        """
+        Rank the documents of this snapshot for a vectorized query (see `ranking.search`).
+
+        `filters` are metadata conditions as accepted by `MetadataIndex.filter`;
+        they restrict the candidates before any document is scored.
+
+        With `max_postings` or `time_budget_ms` the search runs on the impact
+        index and stops early (see `ImpactIndex.search`). A candidate set
+        already bounds the work, so restricted searches stay exhaustive.
+        """
+        if filters:
+            allowed = self.metadata_index.filter_links(**filters)
+            candidates = allowed if candidates is None else allowed & set(candidates)
+        if self.vectorizer is not None:
+            query = self.vectorizer.transform(query)
+        if candidates is None and (max_postings is not None or time_budget_ms is not None):
+            if self.impact_index is None:
+                raise ValueError(f"Snapshot {self.version} was loaded without an impact index")
+            return self.impact_index.search(query, top_k, max_postings, time_budget_ms)[0]
+        return ranking.search(query, self.document_norms, top_k, candidates, index=self.index)
+
+    def phrase_search(self, query, slop=0, top_k=10):
+        """
+        Rank documents by occurrences of the whole query (see `PositionalIndex.phrase_search`).
+        """
+        if self.positional_index is None:
+            raise ValueError(f"Snapshot {self.version} was loaded without a positional index")
+        return self.positional_index.phrase_search(query, slop, top_k)
+
+    def ngram_search(self, query, n=3, slop=0, top_k=10):
+        """
+        Rank documents by the query n-grams they contain (see `PositionalIndex.ngram_search`).
+        """
+        if self.positional_index is None:
+            raise ValueError(f"Snapshot {self.version} was loaded without a positional index")
+        return self.positional_index.ngram_search(query, n, slop, top_k)
+
+
+class SnapshotManager:
+    """
+    Serves searches from the current snapshot and swaps in new ones without downtime.
+
+    Searches pin the snapshot they start on, so a reload never changes the
+    index under a running query; the old snapshot stays alive until its last
+    reader finishes. Snapshot directories that are neither current nor in use
+    are removed by `collect_garbage`.
+    """
+
+    def __init__(self, root="snapshots", keep=2, **options):
+        """
+        :param root: Directory holding the snapshot versions
+        :param keep: Number of most recent versions kept on disk by collect_garbage
+        :param options: Optional indexes every loaded snapshot builds, see `Snapshot.__init__`
+        """
+        self.root = root
+        self.keep = keep
+        self.options = options
+        self.current = None
+        self._lock = threading.Lock()
+        self._readers = {}  # version -> number of searches using it
+        self._reload_thread = None
+
+    @contextmanager
+    def acquire(self):
+        """
+        Pin the current snapshot for the duration of a `with` block.
+
+        :return: The Snapshot (None if nothing has been loaded yet)
+        """
+        with self._lock:
+            snapshot = self.current
+            if snapshot is not None:
+                self._readers[snapshot.version] = self._readers.get(snapshot.version, 0) + 1
+        try:
+            yield snapshot
+        finally:
+            if snapshot is not None:
+                with self._lock:
+                    self._readers[snapshot.version] -= 1
+                    if not self._readers[snapshot.version]:
+                        del self._readers[snapshot.version]
+
+    def search(self, query, top_k=10, candidates=None, filters=None, max_postings=None, time_budget_ms=None):
+        """
+        Search the current snapshot.
+
+        :param query: Vectorized query
+        :param filters: Metadata conditions, see MetadataIndex.filter
+        :param max_postings: Postings budget of an early-terminating search (needs impact=True)
+        :param time_budget_ms: Time budget of an early-terminating search (needs impact=True)
+        :return: List of (link, score) pairs, best first (empty if nothing is loaded)
+        """
+        with self.acquire() as snapshot:
+            if snapshot is None:
+                return []
+            return snapshot.search(query, top_k, candidates, filters, max_postings, time_budget_ms)
+
+    def phrase_search(self, query, slop=0, top_k=10):
+        """
+        Phrase search on the current snapshot, which must have a positional index.
+        """
+        with self.acquire() as snapshot:
+            return snapshot.phrase_search(query, slop, top_k) if snapshot is not None else []
+
+    def ngram_search(self, query, n=3, slop=0, top_k=10):
+        """
+        N-gram search on the current snapshot, which must have a positional index.
+        """
+        with self.acquire() as snapshot:
+            return snapshot.ngram_search(query, n, slop, top_k) if snapshot is not None else []
+
+    def reload(self, background=True):
+        """
+        Load the version CURRENT points to and swap it in once it is fully built.
+
+        :param background: Build the snapshot in a separate thread and return immediately
+        :return: The reload thread when running in the background, otherwise the loaded version
+        """
+        if not background:
+            return self._reload()
+
+        with self._lock:
+            if self._reload_thread is not None and self._reload_thread.is_alive():
+                return self._reload_thread
+            self._reload_thread = threading.Thread(target=self._reload, name="snapshot-reload", daemon=True)
+            self._reload_thread.start()
+            return self._reload_thread
+
+    def _reload(self):
+        version = current_version(self.root)
+        if version is None or (self.current is not None and self.current.version == version):
+            return version
+
+        try:
+            snapshot = Snapshot.load(version, self.root, **self.options)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not load snapshot {version}: {e}")
+            return self.current.version if self.current is not None else None
+
+        with self._lock:
+            self.current = snapshot
+        self.collect_garbage()
+        return version
+
+    def collect_garbage(self):
+        """
+        Delete snapshot directories older than the `keep` most recent versions,
+        unless they are current or still used by a search.
+
+        :return: List of deleted versions
+        """
+        versions = list_versions(self.root)
+        with self._lock:
+            protected = set(self._readers)
+            protected.update(versions[-self.keep:] if self.keep else [])
+            protected.add(current_version(self.root))
+            if self.current is not None:
+                protected.add(self.current.version)
+            deleted = [version for version in versions if version not in protected]
+
+        for version in deleted:
+            shutil.rmtree(os.path.join(self.root, version), ignore_errors=True)
+        return deleted
+
+
+snapshot_manager = SnapshotManager()
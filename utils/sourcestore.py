@@ -0,0 +1,241 @@
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import zlib
+from codeparser import parser
+from utils import chunking
+from utils import invertedindex
+
+BLOCKS_FILE = "blocks.dat"
+INDEX_FILE = "index.json"
+
+
+class SourceStore:
+    def __init__(self, directory="source_store", lines_per_block=64, level=6):
+        """
+        Local store of raw source files, compressed in independent blocks of lines.
+
+        Each file is cut into blocks of `lines_per_block` lines that are
+        zlib-compressed on their own and appended to one data file. The offset
+        index records where every block starts, so a file or a line range is
+        read with one seek and read per block, and only those blocks are
+        decompressed; the store is never loaded into memory as a whole.
+
+        :param directory: Directory of the data file and of its offset index
+        :param lines_per_block: Number of lines per compressed block
+        :param level: zlib compression level
+        """
+        self.directory = directory
+        self.lines_per_block = lines_per_block
+        self.level = level
+        self.index = {}  # link -> {'lines': number of lines, 'sha256': content hash, 'blocks': [[offset, length], ...]}
+        self._file = None
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _load_index(self):
+        path = os.path.join(self.directory, INDEX_FILE)
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Could not load source store index {path}: {e}")
+            return
+        self.lines_per_block = data.get('lines_per_block', self.lines_per_block)
+        self.index = data.get('files', {})
+
+    def __contains__(self, link):
+        return chunking.parent_link(link) in self.index
+
+    def add(self, link, code_content):
+        """
+        Append a file to the store. Adding a link again with the same content
+        writes nothing; with new content it replaces the previous version, whose
+        blocks stay in the data file until `compact` is called.
+
+        :param link: The link of the file
+        :param code_content: The raw source text
+        :return: True if blocks were written
+        """
+        digest = hashlib.sha256(code_content.encode('utf-8', 'surrogatepass')).hexdigest()
+        entry = self.index.get(link)
+        if entry is not None and entry.get('sha256') == digest:
+            return False
+
+        lines = code_content.splitlines(keepends=True)
+        os.makedirs(self.directory, exist_ok=True)
+
+        blocks = []
+        with self._lock, open(os.path.join(self.directory, BLOCKS_FILE), 'ab') as file:
+            offset = file.tell()
+            for start in range(0, max(len(lines), 1), self.lines_per_block):
+                compressed = zlib.compress(''.join(lines[start:start + self.lines_per_block]).encode('utf-8'), self.level)
+                file.write(compressed)
+                blocks.append([offset, len(compressed)])
+                offset += len(compressed)
+
+        self.index[link] = {'lines': len(lines), 'sha256': digest, 'blocks': blocks}
+        return True
+
+    def live_bytes(self):
+        """
+        Size of the blocks the indexed files refer to.
+        """
+        return sum(length for entry in self.index.values() for _, length in entry['blocks'])
+
+    def garbage_bytes(self):
+        """
+        Size of the blocks in the data file that no indexed file refers to any more.
+        """
+        path = os.path.join(self.directory, BLOCKS_FILE)
+        if not os.path.exists(path):
+            return 0
+        return os.path.getsize(path) - self.live_bytes()
+
+    def compact(self):
+        """
+        Rewrite the data file with only the blocks of the indexed files and save
+        the new offsets. Both files are replaced atomically; lookups must not run
+        concurrently, since their offsets change.
+
+        :return: Number of bytes reclaimed
+        """
+        path = os.path.join(self.directory, BLOCKS_FILE)
+        if not os.path.exists(path):
+            return 0
+        before = os.path.getsize(path)
+
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            index = {}
+            with open(path, 'rb') as source, open(path + '.tmp', 'wb') as target:
+                for link, entry in self.index.items():
+                    blocks = []
+                    for offset, length in entry['blocks']:
+                        source.seek(offset)
+                        blocks.append([target.tell(), length])
+                        target.write(source.read(length))
+                    index[link] = dict(entry, blocks=blocks)
+            os.replace(path + '.tmp', path)
+            self.index = index
+        self.save()
+        return before - os.path.getsize(path)
+
+    def save(self):
+        """
+        Write the offset index. The file is replaced atomically.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + '.tmp', 'w') as file:
+            json.dump({'lines_per_block': self.lines_per_block, 'files': self.index}, file)
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _read_block(self, offset, length):
+        with self._lock:
+            if self._file is None:
+                self._file = open(os.path.join(self.directory, BLOCKS_FILE), 'rb')
+            self._file.seek(offset)
+            compressed = self._file.read(length)
+        return zlib.decompress(compressed).decode('utf-8')
+
+    def get_lines(self, link, start_line=1, end_line=None):
+        """
+        Read a line range of a stored file, decompressing only the blocks it spans.
+
+        Chunk links ('...py#L10-L24') resolve to their parent file; without an
+        explicit range their own range is used.
+
+        :param link: The link of a file or chunk
+        :param start_line: First line to return (1-based)
+        :param end_line: Last line to return (inclusive), the end of the file by default
+        :return: The text of the lines, or None if the file is not stored
+        """
+        match = re.search(r'#L(\d+)-L(\d+)$', link)
+        if match and start_line == 1 and end_line is None:
+            start_line, end_line = int(match.group(1)), int(match.group(2))
+
+        entry = self.index.get(chunking.parent_link(link))
+        if entry is None:
+            return None
+
+        end_line = entry['lines'] if end_line is None else min(end_line, entry['lines'])
+        start_line = max(1, start_line)
+        if start_line > end_line:
+            return ''
+
+        first_block = (start_line - 1) // self.lines_per_block
+        last_block = (end_line - 1) // self.lines_per_block
+        lines = []
+        for offset, length in entry['blocks'][first_block:last_block + 1]:
+            lines.extend(self._read_block(offset, length).splitlines(keepends=True))
+
+        skip = start_line - 1 - first_block * self.lines_per_block
+        return ''.join(lines[skip:skip + end_line - start_line + 1])
+
+    def get(self, link):
+        """
+        Read a whole stored file (or the range of a chunk link).
+
+        :param link: The link of a file or chunk
+        :return: The source text, or None if the file is not stored
+        """
+        return self.get_lines(link)
+
+    def snippet(self, link, query, context=3, index=None):
+        """
+        Find the region of a stored document that best matches a query.
+
+        Every line is tokenized with parser.vectorize and scored by the summed
+        idf of the distinct query tokens it contains, so a line sharing a rare
+        identifier with the query beats one sharing only '=' and '0'. The best
+        line is returned with `context` lines around it.
+
+        :param link: The link of a file or chunk
+        :param query: Vectorized query
+        :param context: Number of lines shown before and after the best line
+        :param index: InvertedIndex supplying document frequencies, the global one by default
+        :return: (start_line, end_line, text), or None if the document is not stored
+        """
+        source = self.get(link)
+        if source is None:
+            return None
+
+        match = re.search(r'#L(\d+)-L', link)
+        first_line = int(match.group(1)) if match else 1
+
+        if index is None:
+            index = invertedindex.inverted_index
+        N = index.get_total_documents()
+        weights = {}
+        for token in set(query):
+            df = index.get_document_frequency(token)
+            # Tokens unknown to the index are as rare as it gets
+            weights[token] = 1 + math.log((N + 1) / (df + 1))
+
+        lines = source.splitlines()
+        best_line, best_score = 0, 0
+        for i, line in enumerate(lines):
+            score = sum(weights[token] for token in set(parser.vectorize(line + '\n')) if token in weights)
+            if score > best_score:
+                best_line, best_score = i, score
+
+        start = max(0, best_line - context)
+        end = min(len(lines), best_line + context + 1)
+        return first_line + start, first_line + end - 1, '\n'.join(lines[start:end])
+
+
+source_store = SourceStore()
@@ -0,0 +1,199 @@
+import base64
+import hashlib
+import json
+import os
+import zlib
+from collections import OrderedDict
+from codeparser import parser
+
+
+class TokenCache:
+    def __init__(self, filename="token_cache.json", max_bytes=64 * 1024 * 1024):
+        """
+        Persistent cache of parser.vectorize results keyed by a hash of the source text.
+
+        The file is read on first use, not on construction, so importing the
+        module costs nothing for code that never tokenizes.
+
+        :param filename: The JSON file the cache is loaded from and saved to
+        :param max_bytes: Upper bound on the total size of the encoded token lists
+        """
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> encoded tokens, least recently used first
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._loaded = False
+
+    @staticmethod
+    def key(code_content):
+        """
+        Compute the cache key of a source text.
+
+        The tokenizer version is part of the key, so changing parser.vectorize
+        invalidates every entry without having to clear the file.
+
+        :param code_content: The raw source text
+        :return: Hex digest identifying the source text and tokenizer version
+        """
+        digest = hashlib.sha256(f"v{parser.TOKENIZER_VERSION}\0".encode('utf-8'))
+        digest.update(code_content.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def encode(tokens):
+        """
+        Encode a token list compactly.
+
+        Tokens never contain whitespace (vectorize splits on it), so joining them
+        with newlines is lossless before compression.
+
+        :param tokens: List of tokens
+        :return: Base64 string of the zlib-compressed tokens
+        """
+        raw = '\n'.join(tokens).encode('utf-8', 'surrogatepass')
+        return base64.b64encode(zlib.compress(raw)).decode('ascii')
+
+    @staticmethod
+    def decode(encoded):
+        """
+        Decode a token list produced by encode.
+
+        :param encoded: Base64 string of the zlib-compressed tokens
+        :return: List of tokens
+        """
+        raw = zlib.decompress(base64.b64decode(encoded)).decode('utf-8', 'surrogatepass')
+        return raw.split('\n') if raw else []
+
+    def get(self, code_content):
+        """
+        Look up the tokens of a source text.
+
+        :param code_content: The raw source text
+        :return: The cached token list, or None on a miss
+        """
+        self._ensure_loaded()
+        key = self.key(code_content)
+        encoded = self.entries.get(key)
+        if encoded is None:
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return self.decode(encoded)
+
+    def put(self, code_content, tokens):
+        """
+        Store the tokens of a source text, evicting least recently used entries
+        while the cache is over its size cap.
+
+        :param code_content: The raw source text
+        :param tokens: The token list produced by parser.vectorize
+        """
+        self._ensure_loaded()
+        key = self.key(code_content)
+        encoded = self.encode(tokens)
+
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        if len(encoded) > self.max_bytes:
+            return
+
+        self.entries[key] = encoded
+        self.size += len(encoded)
+
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def vectorize(self, code_content):
+        """
+        Drop-in replacement for parser.vectorize that skips tokenization of
+        source texts seen before.
+
+        :param code_content: The raw source text
+        :return: List of tokens
+        """
+        tokens = self.get(code_content)
+        if tokens is None:
+            tokens = parser.vectorize(code_content)
+            self.put(code_content, tokens)
+        return tokens
+
+    def stats(self):
+        """
+        Report cache usage.
+
+        :return: Dictionary with entries, size, hits, misses, evictions and hit rate
+        """
+        self._ensure_loaded()
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'bytes': self.size,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def load(self):
+        """
+        Load the cache from disk. A missing or unreadable file leaves the cache empty.
+        """
+        self._loaded = True
+        if not self.filename or not os.path.exists(self.filename):
+            return
+
+        try:
+            with open(self.filename, 'r') as file:
+                data = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Could not load token cache {self.filename}: {e}")
+            return
+
+        self.entries.clear()
+        self.size = 0
+        # Entries are saved least recently used first, so re-inserting keeps the order
+        for key, encoded in data.get('entries', []):
+            self.entries[key] = encoded
+            self.size += len(encoded)
+
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def save(self):
+        """
+        Write the cache to disk. The file is replaced atomically so an interrupted
+        save never leaves a truncated cache behind.
+        """
+        # A cache that was never used has nothing to add to the file
+        if not self.filename or not self._loaded:
+            return
+
+        tmp_filename = self.filename + '.tmp'
+        with open(tmp_filename, 'w') as file:
+            json.dump({'entries': list(self.entries.items())}, file)
+        os.replace(tmp_filename, self.filename)
+
+    def clear(self):
+        """
+        Drop every entry and reset the statistics.
+        """
+        self.entries.clear()
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        self._loaded = True
+
+
+token_cache = TokenCache()